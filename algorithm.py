@@ -1,47 +1,305 @@
 from game_board import GameBoard
-from letter import Letter
+from letter import Letter, NEIGHBOURS
 from string import ascii_lowercase
 from collections import namedtuple
 from copy import deepcopy
+from heapq import heappush, heapreplace
+from trie import BOUND_KEY, annotate_bounds
+import instrumentation
+from instrumentation import timed
 
 TOP_N = 5
 Solution = namedtuple("Solution", "word score path")
 
-def find_best_word(trie: dict, board) -> tuple:
+# "recursive" is the original search, copying the path at every step. "bitmask"
+# walks the same tree with a visited bitmask and a single path buffer. "swap"
+# is the bitmask engine with cheaper swaps, see SwapSearch.
+ENGINES = ("recursive", "bitmask", "swap")
+
+@timed("find_best_word")
+def find_best_word(trie: dict, board, engine: str = "recursive", pruning: bool = False) -> tuple:
+    '''Returns the TOP_N best solutions, worst first. pruning cuts off branches
+    of the bitmask engine that can no longer make the top N.'''
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    if engine != "recursive":
+        return (SwapSearch if engine == "swap" else BitmaskSearch)(trie, board, pruning=pruning).search()
+    if pruning:
+        raise ValueError("Pruning is only supported by the bitmask and swap engines")
     trie = trie[""]
+    tiles = board.tiles()
+    used = [False] * len(tiles)
     scored_words = []
-    for letter in board.graph:
-        if not letter.char: continue
-        scored_words += find_best_word_r(trie[letter.char], letter, [letter], board)
+    for letter in tiles:
+        # A trie of only some words, like reverse_lookup's, may have none
+        # starting with the letter
+        if letter.char not in trie: continue
+        scored_words += find_best_word_r(trie[letter.char], letter.tile_number, [(letter.tile_number, letter.char, False)], board, tiles, used)
     unique_scored_words = list({i.word+str(i.score): i for i in scored_words}.values())
     return sorted(list(set(unique_scored_words)), key=lambda x: x[1])[-TOP_N:]
 
 # Modifying in place where I can to avoid overhead of memory allocation
 # I've personally observed benefits in doing this in a minimax implementation in python
-def find_best_word_r(trie: dict, curr_letter: Letter, used_letters: list, board) -> list:
-    curr_letter.used_up = True
+# path holds (tile number, char, swapped) for each letter so far, and used
+# whether each tile is on it. Letters are only made for the words found.
+def find_best_word_r(trie: dict, tile: int, path: list, board, tiles: list, used: list) -> list:
+    used[tile] = True
+    if instrumentation.CURRENT is not None:
+        instrumentation.count_expansion(instrumentation.CURRENT.counters, trie, [tiles[neighbour].char for neighbour in NEIGHBOURS[tile]
+                                        if tiles[neighbour].char and not used[neighbour]], board.num_swaps > 0)
     scored_words = []
-    for letter in board.graph[curr_letter]:
+    for neighbour in NEIGHBOURS[tile]:
+        letter = tiles[neighbour]
         if not letter.char: continue # letters that were not detected
 
-        if not letter.used_up:
+        if not used[neighbour]:
             if board.num_swaps>0:
                 board.num_swaps -= 1
                 for char in ascii_lowercase:
                     if char in trie:
-                        swapped_letter = Letter(char, 0, 1, False, letter.position, True)
-                        scored_words += find_best_word_r(trie[char], letter, used_letters+[swapped_letter], board)
+                        scored_words += find_best_word_r(trie[char], neighbour, path+[(neighbour, char, True)], board, tiles, used)
                 board.num_swaps += 1
                 
             if letter.char in trie:
-                scored_words += find_best_word_r(trie[letter.char], letter, used_letters+[letter], board)
-    curr_letter.used_up = False
+                scored_words += find_best_word_r(trie[letter.char], neighbour, path+[(neighbour, letter.char, False)], board, tiles, used)
+    used[tile] = False
     if "" in trie:
-        word = "".join([l.char for l in used_letters])
+        used_letters = [Letter(char, 0, 1, False, tiles[t].position, True) if swapped else tiles[t] for t, char, swapped in path]
+        word = "".join([char for _, char, _ in path])
         scored_word = Solution(word=word, score=score_letters(used_letters), path=tuple(used_letters))
         scored_words.append(scored_word)
     return scored_words
 
+def word_and_score(solution: Solution) -> tuple:
+    return (solution.word, solution.score)
+
+class TopN:
+    '''Bounded min-heap holding the best n solutions. Solutions with the same
+    word and score count once, like the dedup in find_best_word.
+
+    floor is an optional shared value (anything with a .value, like a
+    multiprocessing RawValue) holding a threshold known from other heaps
+    searching the same board. Any heap's own threshold is a lower bound on the
+    combined one, so the heaps raise it as they fill and all reject against it.'''
+
+    def __init__(self, n: int = TOP_N, floor=None):
+        self.n = n
+        self.floor = floor
+        # entries are (score, insertion count, solution), the count breaks ties
+        # so solutions themselves are never compared
+        self.heap = []
+        self.keys = set()
+        self.pushed = 0
+
+    def threshold(self) -> int:
+        '''A solution has to score more than this to get in'''
+        threshold = self.heap[0][0] if len(self.heap) == self.n else -1
+        if self.floor is None: return threshold
+        return max(threshold, self.floor.value)
+
+    def accepts(self, word: str, score: int) -> bool:
+        '''Whether push would take a solution with this word and score'''
+        return score > self.threshold() and (word, score) not in self.keys
+
+    def push(self, solution: Solution):
+        key = word_and_score(solution)
+        if key in self.keys or solution.score <= self.threshold(): return
+        self.pushed += 1
+        entry = (solution.score, self.pushed, solution)
+        if len(self.heap) < self.n:
+            heappush(self.heap, entry)
+        else:
+            _, _, dropped = heapreplace(self.heap, entry)
+            self.keys.discard(word_and_score(dropped))
+        self.keys.add(key)
+        if self.floor is not None and len(self.heap) == self.n and self.heap[0][0] > self.floor.value:
+            self.floor.value = self.heap[0][0]
+
+    def solutions(self) -> list:
+        '''Solutions sorted worst first, as find_best_word returns them'''
+        return [entry[2] for entry in sorted(self.heap)]
+
+class BitmaskSearch:
+    '''Same search as find_best_word_r, without the per-step allocations.
+
+    Tiles are referred to by their tile number. Visited tiles live in a 25-bit
+    int instead of a list of flags, neighbours come from an adjacency table
+    built once from NEIGHBOURS, and the current path is written into
+    preallocated buffers indexed by depth. Letter objects are only built when a
+    word is found, so the results are the same Solution tuples, in the same
+    order, as the recursive engine.
+
+    With top_n set, words go into a TopN heap instead of a list. Pruning then
+    also bounds each branch: the trie node knows how many letters its longest
+    word still needs and how many letter points the words below it can add,
+    and the board's tiles and multipliers cap what those letters are worth.
+    Branches that can't beat the heap's threshold are cut. floor is passed on
+    to the TopN heap.
+
+    Made while instrumentation is recording, search_r also counts each node
+    into the recording, like find_best_word_r does.'''
+
+    def __init__(self, trie: dict, board, top_n: int = TOP_N, pruning: bool = False, floor=None):
+        if pruning and not top_n:
+            raise ValueError("Pruning needs a top_n to prune against")
+        if pruning and BOUND_KEY not in trie[""]:
+            annotate_bounds(trie)
+        self.trie = trie[""]
+        self.board = board
+        self.tiles = board.tiles()
+        self.chars = [letter.char for letter in self.tiles]
+        # Undetected letters can never be stepped on, so leave them out up front
+        self.adjacency = [tuple(neighbour for neighbour in NEIGHBOURS[tile] if self.chars[neighbour])
+                          for tile in range(len(self.tiles))]
+        # Path buffers, indexed by depth. path_chars holds the char actually
+        # used at that depth, which differs from the tile's char when swapped.
+        self.path_tiles = [0] * len(self.tiles)
+        self.path_chars = [""] * len(self.tiles)
+        self.path_swapped = [False] * len(self.tiles)
+        self.swaps_left = board.num_swaps
+        self.top_n = top_n
+        self.pruning = pruning
+        self.floor = floor
+        # Tile values as score_letters counts them. best_extra[k] is the most k
+        # more tiles could add, best_diamonds[k] the most their diamonds could
+        # add, and any DW tile on the board may double the lot.
+        self.values = [letter.points + letter.has_diamond if letter.char else 0 for letter in self.tiles]
+        self.double_word = [bool(letter.char and letter.does_double_word) for letter in self.tiles]
+        descending = sorted(self.values, reverse=True)
+        self.best_extra = [sum(descending[:k]) for k in range(len(self.tiles) + 1)]
+        descending = sorted([letter.has_diamond for letter in self.tiles], reverse=True)
+        self.best_diamonds = [sum(descending[:k]) for k in range(len(self.tiles) + 1)]
+        self.max_multiplier = max([letter.points // Letter.char_to_points[letter.char] for letter in self.tiles
+                                   if letter.char in Letter.char_to_points], default=1)
+        self.can_double = any(letter.char and letter.does_double_word for letter in self.tiles)
+        self.nodes_visited = 0
+        if instrumentation.CURRENT is not None:
+            # Found ahead of the class's search_r, so its recursive calls
+            # come through here too
+            self.counters = instrumentation.CURRENT.counters
+            self.search_r = self.counted_search_r
+
+    def search(self, start_tiles=None, first_steps=None) -> list:
+        '''Returns all words found in search order, or the top_n solutions worst
+        first when top_n is set. start_tiles limits the words to those starting
+        on those tiles, and first_steps to those whose second tile is one of
+        them, which is how the search is split up between processes.'''
+        self.scored_words = self.new_results()
+        self.nodes_visited = 0
+        for letter in self.tiles:
+            if not letter.char or letter.char not in self.trie: continue
+            tile = letter.tile_number
+            if start_tiles is not None and tile not in start_tiles: continue
+            self.path_tiles[0] = tile
+            self.path_chars[0] = letter.char
+            self.path_swapped[0] = False
+            adjacency = self.adjacency[tile]
+            if first_steps is not None:
+                # The start tile can't be stepped on again, so its neighbours
+                # are only ever read for the first step
+                self.adjacency[tile] = tuple(neighbour for neighbour in adjacency if neighbour in first_steps)
+            self.search_r(self.trie[letter.char], tile, 1, 1 << tile, self.values[tile], self.double_word[tile])
+            self.adjacency[tile] = adjacency
+        return self.scored_words.solutions() if self.top_n else self.scored_words
+
+    def new_results(self):
+        '''Where search puts the words it finds'''
+        return TopN(self.top_n, self.floor) if self.top_n else []
+
+    def cut(self, trie, depth: int, points: int, doubled: bool) -> bool:
+        '''Whether no word below trie can beat the top N's threshold'''
+        remaining, letter_points = trie[BOUND_KEY]
+        remaining = min(remaining, len(self.tiles) - depth)
+        extra = min(self.best_extra[remaining], letter_points*self.max_multiplier + self.best_diamonds[remaining])
+        return (points + extra) * (2 if doubled or self.can_double else 1) <= self.scored_words.threshold()
+
+    def counted_search_r(self, trie, tile: int, depth: int, visited: int, points: int, doubled: bool):
+        '''search_r, first counting the node like find_best_word_r does, or as
+        pruned'''
+        if self.pruning and self.cut(trie, depth, points, doubled):
+            self.counters["nodes"] += 1
+            self.counters["pruned"] += 1
+        else:
+            instrumentation.count_expansion(self.counters, trie, [self.chars[neighbour] for neighbour in self.adjacency[tile]
+                                            if not visited >> neighbour & 1], self.swaps_left > 0)
+        type(self).search_r(self, trie, tile, depth, visited, points, doubled)
+
+    def search_r(self, trie: dict, tile: int, depth: int, visited: int, points: int, doubled: bool):
+        '''points and doubled are the running score_letters sum and DW flag for
+        the path so far, which score the words found'''
+        self.nodes_visited += 1
+        if self.pruning and self.cut(trie, depth, points, doubled): return
+        path_tiles, path_chars, path_swapped = self.path_tiles, self.path_chars, self.path_swapped
+        for neighbour in self.adjacency[tile]:
+            if visited >> neighbour & 1: continue
+            now_visited = visited | 1 << neighbour
+            path_tiles[depth] = neighbour
+            if self.swaps_left > 0:
+                self.swaps_left -= 1
+                path_swapped[depth] = True
+                for char, child in self.swap_children(trie, neighbour):
+                    path_chars[depth] = char
+                    self.search_r(child, neighbour, depth+1, now_visited, points, doubled)
+                path_swapped[depth] = False
+                self.swaps_left += 1
+
+            char = self.chars[neighbour]
+            if char in trie:
+                path_chars[depth] = char
+                self.search_r(trie[char], neighbour, depth+1, now_visited,
+                              points + self.values[neighbour], doubled or self.double_word[neighbour])
+        if "" in trie:
+            self.emit(depth, points*2 if doubled else points)
+
+    def swap_children(self, trie, tile: int):
+        '''(char, child) for each char the tile could be swapped to'''
+        return [(char, trie[char]) for char in ascii_lowercase if char in trie]
+
+    def emit(self, depth: int, score: int):
+        '''Keeps the word spelt by the path so far, scoring score'''
+        solution = self.make_solution(depth, score)
+        if self.top_n:
+            self.scored_words.push(solution)
+        else:
+            self.scored_words.append(solution)
+
+    def make_solution(self, depth: int, score: int) -> Solution:
+        '''The Solution for the path so far, scoring score'''
+        path = []
+        for i in range(depth):
+            letter = self.tiles[self.path_tiles[i]]
+            if self.path_swapped[i]:
+                letter = Letter(self.path_chars[i], 0, 1, False, letter.position, True)
+            path.append(letter)
+        word = "".join(self.path_chars[:depth])
+        return Solution(word=word, score=score, path=tuple(path))
+
+class SwapSearch(BitmaskSearch):
+    '''BitmaskSearch that spends less time on swaps.
+
+    A swap only tries the chars the trie node has children for, instead of
+    checking all 26, and never the tile's own letter: that spells the same
+    words as stepping on the tile unswapped, for fewer points and a swap
+    more, so those paths are skipped before they are searched. And with
+    swaps, most words are still found many times over, spelt through
+    different tiles or with the swaps in different places. Before building
+    a Solution, the word and its score are checked against the top N, so
+    only the first path for each word and score, and only those that would
+    make it in, are ever built. The top N is BitmaskSearch's, less any word
+    listed a second time at the lower score of a swap to its own letter, and
+    ties may keep different words, as the children come in the trie's
+    order.'''
+
+    def swap_children(self, trie, tile: int):
+        own = self.chars[tile]
+        return [(char, child) for char, child in trie.items() if char != "" and char != BOUND_KEY and char != own]
+
+    def emit(self, depth: int, score: int):
+        if not self.top_n:
+            self.scored_words.append(self.make_solution(depth, score))
+        elif self.scored_words.accepts("".join(self.path_chars[:depth]), score):
+            self.scored_words.push(self.make_solution(depth, score))
+
 def score_letters(used_letters: list):
     has_double_word = sum([letter.does_double_word for letter in used_letters]) > 0
     multiplier = 2 if has_double_word else 1
@@ -61,18 +319,15 @@ def draw_solution_on_terminal(board, path):
     return str(board)
 
 if __name__ == "__main__":
-    from dictionary import build_dictionary
-    words = build_dictionary()
+    from dictionary import load_trie
+    trie = load_trie()
 
-    from trie import construct_trie_dic
-    trie_dic = construct_trie_dic(words)
-    
     from game_board import GameBoard
     board = GameBoard('sample_data/game.png')
     print(board)
 
     from algorithm import find_best_word
-    best_scored_words = find_best_word(trie_dic, board)
+    best_scored_words = find_best_word(trie, board, engine="bitmask", pruning=True)
     print([(s.word, s.score) for s in best_scored_words])
     best_path = best_scored_words[-1][2]
     print(draw_solution_on_terminal(board, best_path))
@@ -0,0 +1,179 @@
+'''Solving against a deadline.
+
+find_best_word only answers once the whole search is done, which can be
+seconds with swaps. AnytimeSearch walks the same tree a piece at a time, the
+pieces being a start tile and the tile stepped onto first like in
+parallel.py, most valuable tiles first. It yields the top N found so far
+whenever it improves, and stops when the deadline passes. Searching the DW
+and high scoring tiles first means good words turn up early.
+`python3 benchmark.py anytime` times a search run to the end against
+find_best_word's.
+
+improvements_async hands the search to an AnytimeWorker process, so the
+event loop keeps its GIL, and receives each Progress through a pipe.
+Cancelling it sets the worker's stop event, which is checked along with the
+deadline.'''
+
+import asyncio
+import time
+from collections import namedtuple
+from multiprocessing import get_all_start_methods, get_context
+from algorithm import BitmaskSearch, TopN, TOP_N
+
+# Deadline checks are every CHECK_MASK + 1 nodes
+CHECK_MASK = 255
+
+# solutions are the top N so far, worst first. finished is None until the
+# last Progress, where it's whether the whole tree was searched before the
+# deadline.
+Progress = namedtuple("Progress", "solutions finished")
+
+class OutOfTime(Exception):
+    pass
+
+class AnytimeSearch(BitmaskSearch):
+    '''BitmaskSearch in order of tile value, stopping at a deadline, given in
+    seconds from when improvements is called, or once stop (an Event, from
+    threading or multiprocessing) is set'''
+
+    def __init__(self, trie: dict, board, seconds: float = None, top_n: int = TOP_N, pruning: bool = True, stop=None):
+        super().__init__(trie, board, top_n, pruning)
+        self.seconds = seconds
+        self.deadline = None
+        self.stop = stop
+        self.best = TopN(top_n)
+        self.order = list(zip(self.double_word, self.values))
+        self.adjacency = [tuple(sorted(adjacents, key=self.order.__getitem__, reverse=True)) for adjacents in self.adjacency]
+        self.total_nodes = 0
+
+    def pieces(self) -> list:
+        '''(start tile, first steps) pairs, best tiles first'''
+        pieces = []
+        starts = [letter.tile_number for letter in self.tiles if letter.char]
+        for tile in sorted(starts, key=self.order.__getitem__, reverse=True):
+            # A start tile with nowhere to go still has its one letter word
+            pieces += [(tile, (step,)) for step in self.adjacency[tile]] or [(tile, ())]
+        return pieces
+
+    def improvements(self):
+        '''Yields a Progress each time the top N improves, and a last one once
+        the search is done or out of time'''
+        if self.seconds is not None:
+            self.deadline = time.perf_counter() + self.seconds
+        pushed = 0
+        finished = True
+        for start_tile, first_steps in self.pieces():
+            try:
+                self.search(start_tiles=(start_tile,), first_steps=first_steps)
+            except OutOfTime:
+                finished = False
+                break
+            finally:
+                self.total_nodes += self.nodes_visited
+            if self.best.pushed != pushed:
+                pushed = self.best.pushed
+                yield Progress(self.best.solutions(), None)
+        yield Progress(self.best.solutions(), finished)
+
+    def new_results(self):
+        # one heap across all the pieces
+        return self.best
+
+    def out_of_time(self) -> bool:
+        return ((self.deadline is not None and time.perf_counter() > self.deadline)
+                or (self.stop is not None and self.stop.is_set()))
+
+    def search_r(self, trie: dict, tile: int, depth: int, visited: int, points: int, doubled: bool):
+        if not self.nodes_visited & CHECK_MASK and self.out_of_time():
+            # Leaves the path buffers and swaps_left mid search, so this
+            # AnytimeSearch can't be searched again
+            raise OutOfTime()
+        super().search_r(trie, tile, depth, visited, points, doubled)
+
+def solve_anytime(trie: dict, board, seconds: float, top_n: int = TOP_N) -> Progress:
+    '''The best top_n found within seconds, and whether that's all of them'''
+    for progress in AnytimeSearch(trie, board, seconds, top_n).improvements():
+        pass
+    return progress
+
+def serve_searches(connection, trie: dict, stop):
+    '''An AnytimeWorker's process. For each (board, seconds, top_n) received,
+    sends each Progress, then None, or what the search raised. Stops at None.'''
+    if trie is None:
+        from dictionary import load_trie
+        trie = load_trie()
+    while (job := connection.recv()) is not None:
+        board, seconds, top_n = job
+        try:
+            for progress in AnytimeSearch(trie, board, seconds, top_n, stop=stop).improvements():
+                connection.send(progress)
+            connection.send(None)
+        except Exception as e:
+            connection.send(e)
+
+class AnytimeWorker:
+    '''A process that runs improvements_async's searches, one at a time.
+    Start it before the event loop, as forking a process running threads
+    isn't safe. With fork it shares trie without pickling it, otherwise it's
+    spawned and maps the cached trie. Use as a context manager, or call
+    close.'''
+
+    def __init__(self, trie: dict):
+        if "fork" in get_all_start_methods():
+            context = get_context("fork")
+        else:
+            context, trie = get_context("spawn"), None
+        self.stop = context.Event()
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=serve_searches, args=(child, trie, self.stop), daemon=True)
+        self.process.start()
+        child.close()
+        self.lock = asyncio.Lock()
+
+    def close(self):
+        self.connection.send(None)
+        self.process.join()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+
+async def improvements_async(worker: AnytimeWorker, board, seconds: float, top_n: int = TOP_N):
+    '''AnytimeSearch.improvements as an async generator, searching in worker.
+    Cancelling or closing the generator stops the search at its next
+    deadline check.'''
+    loop = asyncio.get_running_loop()
+    # Waiting on the pipe blocks, so it's done on the loop's default executor
+    receive = lambda: loop.run_in_executor(None, worker.connection.recv)
+    async with worker.lock:
+        worker.stop.clear()
+        worker.connection.send((board, seconds, top_n))
+        # A cancelled wait's recv still takes the next message off the pipe, so
+        # it's shielded and awaited again below
+        pending = None
+        finished = False
+        try:
+            while True:
+                pending = receive()
+                progress = await asyncio.shield(pending)
+                pending = None
+                finished = progress is None or isinstance(progress, Exception)
+                if progress is None: break
+                if isinstance(progress, Exception): raise progress
+                yield progress
+        finally:
+            worker.stop.set()
+            # The rest of a stopped search is read, so the next one starts
+            # with an empty pipe
+            while not finished:
+                progress = await (pending or receive())
+                pending = None
+                finished = progress is None or isinstance(progress, Exception)
+
+async def solve_async(worker: AnytimeWorker, board, seconds: float, top_n: int = TOP_N) -> Progress:
+    '''solve_anytime without blocking the event loop'''
+    async for progress in improvements_async(worker, board, seconds, top_n):
+        pass
+    return progress
@@ -0,0 +1,155 @@
+'''Solves many boards in one run, loading the dictionary once.
+
+Boards come from a directory of screenshots, or from a JSONL file (or stdin,
+with "-") holding one board per line. A line is either a screenshot:
+    {"id": "a", "image": "sample_data/game.png", "swaps": 1}
+or the 25 letters, left to right, top to bottom, with optional modifiers given
+as [x, y] tile positions from the top left:
+    {"id": "b", "letters": "uuifioplgzreiilotdioaqyio", "swaps": 1,
+     "diamonds": [[0, 0], [4, 2]], "dl": [3, 4], "tl": null, "dw": [4, 0]}
+or the same board as a GameBoard.from_string line:
+    {"id": "c", "board": "uuifioplgzreiilotdioaqyio/yyynnnynnnynynynnnynnnyyn/4 0/3 4//2"}
+
+Boards are spread over a process pool and a JSON line is printed for each one
+as soon as it is solved. Run `python3 batch.py boards.jsonl > results.jsonl`.'''
+
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from multiprocessing import get_all_start_methods, get_context
+from algorithm import ENGINES
+from game_board import GameBoard, NUM_PROCS, OCR_BACKENDS
+import instrumentation
+import parallel
+import reverse_lookup
+from reverse_lookup import ReverseLookup, STRATEGIES
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# Set before the pool starts, like parallel.TRIE. Forked workers inherit it
+# copy-on-write instead of each building their own. Only needed by the
+# filtered strategy.
+LOOKUP = None
+
+def read_boards(source: str):
+    '''Yields board descriptions as dicts from a directory of images, a JSONL
+    file or "-" for JSONL on stdin'''
+    if os.path.isdir(source):
+        for file_name in sorted(os.listdir(source)):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                yield {"id": file_name, "image": os.path.join(source, file_name)}
+        return
+    f = sys.stdin if source == "-" else open(source)
+    try:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip(): continue
+            board = json.loads(line)
+            board.setdefault("id", line_number)
+            yield board
+    finally:
+        if f is not sys.stdin: f.close()
+
+def board_from_dict(board: dict, default_swaps: int = 0, ocr: str = "tesseract") -> GameBoard:
+    num_swaps = board.get("swaps")
+    # "swaps": null means the default too, not asking for it on stdin
+    if num_swaps is None:
+        num_swaps = default_swaps
+    if "image" in board:
+        # Pool workers are daemonic and can't start the OCR pool of their own
+        return GameBoard(board["image"], num_swaps=num_swaps, processes=1, ocr=ocr)
+    if "board" in board:
+        return GameBoard.from_string(board["board"], num_swaps)
+    return GameBoard.from_dict(dict(board, swaps=num_swaps))
+
+def solution_to_dict(solution) -> dict:
+    return {
+        "word": solution.word,
+        "score": solution.score,
+        "path": [list(letter.position) for letter in solution.path],
+        "swapped": [i for i, letter in enumerate(solution.path) if letter.swapped_letter],
+    }
+
+def solve_board(job: tuple) -> dict:
+    '''Solves one board description in a worker. Errors are reported in the
+    result so one bad board doesn't stop the batch.'''
+    board, default_swaps, ocr, engine, pruning, strategy, stats, profile = job
+    start = time.perf_counter()
+    result = {"id": board.get("id")}
+    with instrumentation.record(profile) if stats or profile else nullcontext() as recorded:
+        try:
+            solutions = reverse_lookup.solve(parallel.TRIE, board_from_dict(board, default_swaps, ocr), strategy, LOOKUP, engine, pruning)
+            result["solutions"] = [solution_to_dict(s) for s in reversed(solutions)]
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    if recorded is not None:
+        result["stats"] = recorded.to_dict()
+    return result
+
+def init_worker(strategy: str = "full"):
+    parallel.load_worker_trie()
+    load_lookup(strategy)
+
+def load_lookup(strategy: str):
+    global LOOKUP
+    if strategy == "filtered" and LOOKUP is None:
+        from dictionary import load_dictionary
+        LOOKUP = ReverseLookup(load_dictionary())
+
+def solve_batch(boards, trie, processes: int = NUM_PROCS, default_swaps: int = 0, ocr: str = "tesseract", engine: str = "bitmask",
+                pruning: bool = True, stats: bool = False, profile: str = None, strategy: str = "full"):
+    '''Yields a result dict per board, in the order they finish. Results hold
+    the solutions best first, or an error, and the seconds spent on the board.
+    With stats or a profile, they also hold the instrumentation's Stats.
+    pruning None leaves it to the strategy, see reverse_lookup.solve.'''
+    parallel.TRIE = trie
+    load_lookup(strategy)
+    jobs = ((board, default_swaps, ocr, engine, pruning, strategy, stats, profile) for board in boards)
+    if processes <= 1:
+        yield from map(solve_board, jobs)
+        return
+    if "fork" in get_all_start_methods():
+        context, initializer = get_context("fork"), None
+    else:
+        context, initializer = get_context(), init_worker
+    with context.Pool(processes=processes, initializer=initializer, initargs=(strategy,) if initializer else ()) as pool:
+        yield from pool.imap_unordered(solve_board, jobs)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Solves a batch of boards.")
+    parser.add_argument("source", help="directory of screenshots, JSONL file of boards, or - for JSONL on stdin")
+    parser.add_argument("--processes", type=int, default=NUM_PROCS)
+    parser.add_argument("--swaps", type=int, default=0, help="swaps for boards that don't say")
+    parser.add_argument("--ocr", choices=OCR_BACKENDS, default="tesseract", help="how to read screenshots")
+    parser.add_argument("--engine", choices=ENGINES, default="bitmask")
+    parser.add_argument("--no-pruning", action="store_true")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="full",
+                        help="search the whole dictionary, or only the words each board's letters could spell")
+    parser.add_argument("--stats", action="store_true", help="add search counters and OCR timings to each result")
+    parser.add_argument("--profile", choices=instrumentation.PROFILERS, help="add a profile of each solve to its result")
+    args = parser.parse_args()
+
+    from dictionary import load_trie
+    start = time.perf_counter()
+    trie = load_trie()
+    print(f"Loaded dictionary in {time.perf_counter() - start:.3f}s", file=sys.stderr)
+
+    start = time.perf_counter()
+    timings = []
+    pruning = not args.no_pruning and args.engine == "bitmask"
+    if pruning and args.strategy == "filtered":
+        # The filtered strategy only prunes where it pays off
+        pruning = None
+    for result in solve_batch(read_boards(args.source), trie, args.processes, args.swaps, args.ocr, args.engine, pruning,
+                              args.stats, args.profile, args.strategy):
+        print(json.dumps(result), flush=True)
+        timings.append(result["seconds"])
+    elapsed = time.perf_counter() - start
+
+    if timings:
+        timings.sort()
+        print(f"Solved {len(timings)} boards in {elapsed:.3f}s ({len(timings)/elapsed:.1f} boards/s). "
+              f"Per board: mean {sum(timings)/len(timings):.3f}s, median {timings[len(timings)//2]:.3f}s, max {timings[-1]:.3f}s",
+              file=sys.stderr)
@@ -0,0 +1,292 @@
+'''Benchmarks for the solver on reproducible random boards. Run with
+`python3 benchmark.py [pruning|parallel|tiles|filter|suite]`.
+
+The suite times every stage from loading the dictionary to solving, on a
+seeded corpus of boards with modifiers and 0 to 3 swaps, and writes the
+results as JSON. Given a baseline from an earlier run, it flags stages that
+got slower or search more nodes, and exits non-zero:
+    python3 benchmark.py suite --output baseline.json
+    ... change things ...
+    python3 benchmark.py suite --baseline baseline.json'''
+
+import contextlib
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+import tracemalloc
+import cv2
+from game_board import GameBoard
+from letter import LETTER_FREQUENCIES
+from algorithm import BitmaskSearch
+from parallel import ParallelSolver, NUM_PROCS
+
+SEED = 0
+BOARDS_PER_SWAP_COUNT = 5
+SWAP_COUNTS = [0, 1, 2]
+SAMPLE_IMAGES = ['sample_data/game.png', 'sample_data/game_2.png', 'sample_data/missing-letter-game.png']
+# The samples are ~440px, so these cover phone sized up to 1080p and 4K screenshots
+IMAGE_SCALES = [0.5, 1, 2.5, 5]
+# Boards in the suite's corpus for each swap count. Solves slow down about
+# tenfold with each swap.
+SUITE_BOARDS = {0: 20, 1: 8, 2: 3, 3: 1}
+SUITE_REPEATS = 3
+# A stage this many times slower than the baseline is a regression. Timings
+# on a busy machine wobble by a good 10%.
+REGRESSION_RATIO = 1.25
+
+def random_letters(rng: random.Random) -> str:
+    return "".join(rng.choices(list(LETTER_FREQUENCIES), weights=list(LETTER_FREQUENCIES.values()), k=25))
+
+def random_boards(seed: int = SEED, per_swap_count: int = BOARDS_PER_SWAP_COUNT, swap_counts: list = SWAP_COUNTS) -> list:
+    rng = random.Random(seed)
+    return [GameBoard.from_letters(random_letters(rng), num_swaps) for num_swaps in swap_counts for _ in range(per_swap_count)]
+
+def random_board(rng: random.Random, num_swaps: int) -> GameBoard:
+    '''A random board with some diamonds, and each of DL, TL and DW on a random
+    tile half of the time'''
+    positions = [GameBoard.get_position(i) for i in range(25)]
+    modifiers = [rng.choice(positions) if rng.random() < 0.5 else None for _ in range(3)]
+    # DL and TL can't share a tile
+    if modifiers[0] == modifiers[1]: modifiers[1] = None
+    return GameBoard.from_letters(random_letters(rng), num_swaps, diamonds=rng.sample(positions, rng.randint(0, 5)),
+                                  double_letter=modifiers[0], triple_letter=modifiers[1], double_word=modifiers[2])
+
+def suite_corpus(seed: int = SEED, boards: dict = SUITE_BOARDS) -> list:
+    rng = random.Random(seed)
+    return [random_board(rng, num_swaps) for num_swaps, count in sorted(boards.items()) for _ in range(count)]
+
+def measure(stage, repeats: int = SUITE_REPEATS, memory: bool = True) -> dict:
+    '''Times stage() repeats times, then runs it once more under tracemalloc
+    for its peak memory, as tracing slows it down too much to time. Returns
+    the timings and stage's last result.'''
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = stage()
+        runs.append(time.perf_counter() - start)
+    measured = {"seconds": statistics.median(runs), "runs": runs}
+    if memory:
+        tracemalloc.start()
+        stage()
+        measured["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return measured, result
+
+def bench_suite(seed: int = SEED, boards: dict = SUITE_BOARDS, repeats: int = SUITE_REPEATS) -> dict:
+    '''Runs every stage and returns the results, ready to dump as JSON'''
+    from dictionary import build_dictionary, load_dictionary, load_trie, stream_trie
+    from trie import construct_trie_dic, annotate_bounds
+    stages = {}
+    def run(name, stage, repeats=repeats, memory=True):
+        print(f"{name}...", file=sys.stderr)
+        stages[name], result = measure(stage, repeats, memory)
+        return result
+
+    words = run("dictionary_build", build_dictionary, 1)
+    run("dictionary_load", load_dictionary)
+    trie = run("trie_build", lambda: construct_trie_dic(words), 1)
+    run("trie_stream", stream_trie, 1)
+    # Annotating again only replaces the bounds already there, so its memory
+    # use says nothing
+    run("trie_bounds", lambda: annotate_bounds(trie), 1, False)
+    dawg = run("dawg_load", load_trie)
+
+    reader = GameBoard.__new__(GameBoard)
+    images = [cv2.imread(path) for path in SAMPLE_IMAGES]
+    run("tile_detection", lambda: [reader.find_tile_bounds(image) for image in images])
+    run("ocr_template", lambda: [GameBoard(path, 0, ocr="template") for path in SAMPLE_IMAGES])
+    if shutil.which("tesseract"):
+        run("ocr_tesseract", lambda: [GameBoard(path, 0, processes=1) for path in SAMPLE_IMAGES], 1)
+
+    corpus = suite_corpus(seed, boards)
+    run("graph_construction", lambda: [GameBoard.construct_graph_from_grid(board.grid) for board in corpus])
+    for num_swaps in sorted(boards):
+        swap_boards = [board for board in corpus if board.num_swaps == num_swaps]
+        searches = []
+        def solve():
+            searches[:] = [BitmaskSearch(dawg, board, pruning=True) for board in swap_boards]
+            return [search.search() for search in searches]
+        # Slow solves are timed once and not traced
+        slow = num_swaps >= 2
+        solutions = run(f"solve_{num_swaps}_swaps", solve, 1 if slow else repeats, not slow)
+        stages[f"solve_{num_swaps}_swaps"].update({
+            "boards": len(swap_boards),
+            "nodes": sum(search.nodes_visited for search in searches),
+            "best_scores": [board_solutions[-1].score if board_solutions else 0 for board_solutions in solutions],
+        })
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "boards": {str(num_swaps): count for num_swaps, count in sorted(boards.items())},
+        "stages": stages,
+    }
+
+def compare_suite(results: dict, baseline: dict, ratio: float = REGRESSION_RATIO) -> list:
+    '''Prints each stage against the baseline and returns the regressions'''
+    regressions = []
+    if results["seed"] != baseline["seed"] or results["boards"] != baseline["boards"]:
+        print("WARN: the baseline was run on a different corpus, so nodes and scores won't match.")
+    print(f"{'stage':<20} {'baseline':>9} {'now':>9} {'ratio':>6} {'nodes':>9} {'peak MB':>8}")
+    for name, stage in results["stages"].items():
+        if name not in baseline["stages"]:
+            print(f"{name:<20} {'':>9} {stage['seconds']:>9.4f}")
+            continue
+        before = baseline["stages"][name]
+        change = stage["seconds"] / before["seconds"] if before["seconds"] else 1
+        notes = []
+        if change > ratio: notes.append("SLOWER")
+        if "nodes" in stage and stage["nodes"] > before.get("nodes", stage["nodes"]): notes.append("MORE NODES")
+        if "best_scores" in stage and stage["best_scores"] != before.get("best_scores", stage["best_scores"]): notes.append("SCORES CHANGED")
+        if notes: regressions.append((name, notes))
+        nodes = f"{stage['nodes'] / before['nodes']:>9.2f}" if before.get("nodes") else f"{'':>9}"
+        peak = f"{stage['peak_bytes'] / 1e6:>8.1f}" if "peak_bytes" in stage else f"{'':>8}"
+        print(f"{name:<20} {before['seconds']:>9.4f} {stage['seconds']:>9.4f} {change:>6.2f} {nodes} {peak} {' '.join(notes)}")
+    return regressions
+
+def bench_pruning(trie: dict, boards: list):
+    '''Runs the bitmask engine with and without pruning on each board, and
+    prints the nodes visited and time taken by each'''
+    print(f"{'swaps':>5} {'letters':<25} {'nodes':>9} {'pruned':>9} {'ratio':>6} {'secs':>7} {'pruned':>7}")
+    totals = [0, 0, 0.0, 0.0]
+    for board in boards:
+        row = []
+        for pruning in [False, True]:
+            search = BitmaskSearch(trie, board, pruning=pruning)
+            start = time.perf_counter()
+            solutions = search.search()
+            row.append((search.nodes_visited, time.perf_counter() - start, solutions))
+        (nodes, secs, solutions), (pruned_nodes, pruned_secs, pruned_solutions) = row
+        assert([s.score for s in solutions] == [s.score for s in pruned_solutions])
+        letters = "".join(letter.char for grid_row in board.grid for letter in grid_row)
+        print(f"{board.num_swaps:>5} {letters:<25} {nodes:>9} {pruned_nodes:>9} {pruned_nodes/nodes:>6.2f} {secs:>7.3f} {pruned_secs:>7.3f}")
+        for i, value in enumerate([nodes, pruned_nodes, secs, pruned_secs]):
+            totals[i] += value
+    nodes, pruned_nodes, secs, pruned_secs = totals
+    print(f"{'total':>5} {'':<25} {nodes:>9} {pruned_nodes:>9} {pruned_nodes/nodes:>6.2f} {secs:>7.3f} {pruned_secs:>7.3f}")
+
+def bench_parallel(trie: dict, boards: list, processes: int = NUM_PROCS):
+    '''Compares the wall clock time of the pruned bitmask engine on one core
+    against the same search split across a pool of processes'''
+    print(f"{'swaps':>5} {'letters':<25} {'serial':>8} {'parallel':>8} {'speedup':>7}")
+    with ParallelSolver(trie, processes) as solver:
+        for board in boards:
+            start = time.perf_counter()
+            solutions = BitmaskSearch(trie, board, pruning=True).search()
+            serial_secs = time.perf_counter() - start
+            start = time.perf_counter()
+            parallel_solutions = solver.solve(board)
+            parallel_secs = time.perf_counter() - start
+            assert([s.score for s in solutions] == [s.score for s in parallel_solutions])
+            letters = "".join(letter.char for grid_row in board.grid for letter in grid_row)
+            print(f"{board.num_swaps:>5} {letters:<25} {serial_secs:>8.3f} {parallel_secs:>8.3f} {serial_secs/parallel_secs:>7.2f}")
+
+def bench_filter(trie: dict, dawg, lookup, boards: list):
+    '''Times the pruned search of the whole dictionary, as a dict trie and as
+    the mapped DAWG, against filtering the dictionary down to each board and
+    searching that'''
+    print(f"{'swaps':>5} {'letters':<25} {'words':>7} {'trie':>7} {'dawg':>7} {'filtered':>8}")
+    totals = {}
+    for board in boards:
+        row = []
+        for solve in [lambda: BitmaskSearch(trie, board, pruning=True).search(),
+                      lambda: BitmaskSearch(dawg, board, pruning=True).search(),
+                      lambda: lookup.solve(board)]:
+            start = time.perf_counter()
+            solutions = solve()
+            row.append((time.perf_counter() - start, [s.score for s in solutions]))
+        assert(row[0][1] == row[1][1] == row[2][1])
+        secs = [seconds for seconds, _ in row]
+        totals[board.num_swaps] = [total + seconds for total, seconds in zip(totals.get(board.num_swaps, [0, 0, 0]), secs)]
+        letters = "".join(letter.char for grid_row in board.grid for letter in grid_row)
+        print(f"{board.num_swaps:>5} {letters:<25} {len(lookup.filter_words(board)):>7} {secs[0]:>7.3f} {secs[1]:>7.3f} {secs[2]:>8.3f}")
+    for num_swaps, secs in sorted(totals.items()):
+        print(f"{num_swaps:>5} {'total':<25} {'':>7} {secs[0]:>7.3f} {secs[1]:>7.3f} {secs[2]:>8.3f}")
+
+def bench_anytime(trie: dict, boards: list):
+    '''Times the pruned bitmask engine against an AnytimeSearch run to the
+    end, which searches piece by piece'''
+    from anytime import solve_anytime
+    print(f"{'swaps':>5} {'letters':<25} {'bitmask':>8} {'anytime':>8} {'ratio':>6}")
+    for board in boards:
+        start = time.perf_counter()
+        solutions = BitmaskSearch(trie, board, pruning=True).search()
+        bitmask_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        progress = solve_anytime(trie, board, None)
+        anytime_secs = time.perf_counter() - start
+        assert([s.score for s in solutions] == [s.score for s in progress.solutions])
+        letters = "".join(letter.char for grid_row in board.grid for letter in grid_row)
+        print(f"{board.num_swaps:>5} {letters:<25} {bitmask_secs:>8.3f} {anytime_secs:>8.3f} {anytime_secs/bitmask_secs:>6.2f}")
+
+def bench_tile_detection(image_paths: list = SAMPLE_IMAGES, scales: list = IMAGE_SCALES, repeats: int = 5):
+    '''Times GameBoard.find_tile_bounds on screenshots resized to each scale,
+    and how far the tile bounds found move from the unscaled ones'''
+    board = GameBoard.__new__(GameBoard)
+    print(f"{'image':<40} {'scale':>5} {'size':>11} {'ms':>7} {'max drift':>9}")
+    for path in image_paths:
+        image = cv2.imread(path)
+        expected = board.find_tile_bounds(image)
+        for scale in scales:
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            scaled = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                bounds = board.find_tile_bounds(scaled)
+            millis = (time.perf_counter() - start) / repeats * 1000
+            # in pixels of the unscaled image
+            drift = max(abs(found/scale - original) for bound, expected_bound in zip(bounds, expected)
+                        for found, original in zip(bound, expected_bound))
+            h, w, _ = scaled.shape
+            print(f"{path:<40} {scale:>5} {f'{w}x{h}':>11} {millis:>7.2f} {drift:>9.1f}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmarks the solver on random boards.")
+    parser.add_argument("benchmark", nargs="?", choices=["pruning", "parallel", "tiles", "filter", "anytime", "suite"], default="pruning")
+    parser.add_argument("--boards", type=int, default=BOARDS_PER_SWAP_COUNT, help="boards per swap count")
+    parser.add_argument("--swaps", type=int, nargs="+", help="swap counts to generate boards for")
+    parser.add_argument("--processes", type=int, default=NUM_PROCS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", help="suite: file to write the results to, instead of stdout")
+    parser.add_argument("--baseline", help="suite: results of an earlier run to compare against")
+    parser.add_argument("--ratio", type=float, default=REGRESSION_RATIO, help="suite: how much slower than the baseline is a regression")
+    args = parser.parse_args()
+    if args.benchmark == "suite":
+        # Keeps the WARN prints out of the JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            results = bench_suite(args.seed)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        elif not args.baseline:
+            print(json.dumps(results, indent=2))
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_suite(results, json.load(f), args.ratio)
+            if regressions:
+                print(f"{len(regressions)} stages regressed.")
+                sys.exit(1)
+    elif args.benchmark == "tiles":
+        bench_tile_detection()
+    else:
+        from dictionary import build_dictionary
+        from trie import construct_trie_dic, annotate_bounds
+        words = build_dictionary()
+        trie = construct_trie_dic(words)
+        # Annotate up front so it isn't counted in the first pruned solve
+        annotate_bounds(trie)
+        if args.benchmark == "pruning":
+            bench_pruning(trie, random_boards(per_swap_count=args.boards, swap_counts=args.swaps or SWAP_COUNTS))
+        elif args.benchmark == "filter":
+            from reverse_lookup import ReverseLookup
+            from dictionary import load_trie
+            bench_filter(trie, load_trie(), ReverseLookup(words), random_boards(per_swap_count=args.boards, swap_counts=args.swaps or SWAP_COUNTS))
+        elif args.benchmark == "anytime":
+            bench_anytime(trie, random_boards(per_swap_count=args.boards, swap_counts=args.swaps or SWAP_COUNTS))
+        else:
+            bench_parallel(trie, random_boards(per_swap_count=args.boards, swap_counts=args.swaps or [3]), args.processes)
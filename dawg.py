@@ -0,0 +1,181 @@
+'''Minimized trie (DAWG) stored as flat integer arrays.
+
+Suffixes shared between words are stored once, and every node is a fixed-size
+row of 26 child indices, so the whole dictionary fits in a few flat arrays.
+save writes those arrays to a binary file that load_dawg memory-maps without
+any parsing. Processes that load the same file share one page-cached copy.
+
+A Dawg walks like the dict trie from trie.construct_trie_dic: `char in node`,
+`node[char]`, `"" in node` at the end of a word and `node[BOUND_KEY]`, so the
+solver in algorithm.py doesn't care which one it is given.'''
+
+import hashlib
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from string import ascii_lowercase
+from letter import Letter
+from trie import BOUND_KEY
+
+DAWG_PATH = 'dictionary.dawg'
+
+MAGIC = b"DAWG"
+VERSION = 1
+# magic, version, node count, root index
+HEADER = struct.Struct("<4sIII")
+ALPHABET_LEN = len(ascii_lowercase)
+CHAR_INDEX = {char: i for i, char in enumerate(ascii_lowercase)}
+
+class Dawg:
+    '''Flat arrays of a minimized trie. Node 0 is never used, so a 0 child
+    index means there is no child.
+
+    children[node*26 + i] is the child along the i-th letter, terminal[node] is
+    1 if a word ends at node, and max_len/max_points are the bounds described
+    by trie.BOUND_KEY.'''
+
+    def __init__(self, root: int, children, terminal, max_len, max_points, buffer=None):
+        self.root = root
+        self.children = children
+        self.terminal = terminal
+        self.max_len = max_len
+        self.max_points = max_points
+        # the mmap backing the arrays, kept so it stays open while they are in use
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.terminal)
+
+    # The dict trie's root is {"": root_node}, so support the same lookup
+    def __contains__(self, char):
+        return char == ""
+
+    def __getitem__(self, char):
+        if char != "": raise KeyError(char)
+        return DawgNode(self, self.root)
+
+    def save(self, path: str = DAWG_PATH):
+        arrays = [array("I", self.children), array("H", self.max_points), array("B", self.terminal), array("B", self.max_len)]
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self), self.root))
+            for arr in arrays:
+                # The arrays are mapped back as they are, so always write little-endian
+                if sys.byteorder == "big": arr.byteswap()
+                f.write(arr.tobytes())
+
+    def fingerprint(self) -> str:
+        '''Hash of the arrays, the same for every copy of the same DAWG'''
+        key = hashlib.sha256(struct.pack("<I", self.root))
+        for arr in (self.children, self.max_points, self.terminal, self.max_len):
+            key.update(memoryview(arr).cast("B"))
+        return key.hexdigest()[:16]
+
+class DawgNode(Mapping):
+    '''A node in a Dawg, looked up like a node of the dict trie'''
+    __slots__ = ("dawg", "index")
+
+    def __init__(self, dawg: Dawg, index: int):
+        self.dawg = dawg
+        self.index = index
+
+    def __contains__(self, char):
+        if char == "": return self.dawg.terminal[self.index] == 1
+        if char == BOUND_KEY: return True
+        i = CHAR_INDEX.get(char)
+        return i is not None and self.dawg.children[self.index*ALPHABET_LEN + i] != 0
+
+    def __getitem__(self, char):
+        if char == BOUND_KEY:
+            return (self.dawg.max_len[self.index], self.dawg.max_points[self.index])
+        if char == "":
+            # word termination, stored as None in the dict trie
+            if self.dawg.terminal[self.index] == 1: return None
+            raise KeyError(char)
+        i = CHAR_INDEX.get(char)
+        child = 0 if i is None else self.dawg.children[self.index*ALPHABET_LEN + i]
+        if not child: raise KeyError(char)
+        return DawgNode(self.dawg, child)
+
+    def __iter__(self):
+        if self.dawg.terminal[self.index] == 1: yield ""
+        start = self.index*ALPHABET_LEN
+        for i, char in enumerate(ascii_lowercase):
+            if self.dawg.children[start + i]: yield char
+        yield BOUND_KEY
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    # Nodes are views, two are the same node if they point at the same index
+    def __eq__(self, other):
+        if not isinstance(other, DawgNode): return NotImplemented
+        return self.dawg is other.dawg and self.index == other.index
+    def __hash__(self):
+        return hash(self.index)
+
+def build_dawg(words) -> Dawg:
+    '''Builds a minimized trie from a list or iterator of words. Words with
+    characters outside a-z can never be played, so they are left out.'''
+    from trie import construct_trie_dic
+    words = (word for word in (word.lower() for word in words) if all(char in CHAR_INDEX for char in word))
+    trie = construct_trie_dic(words)[""]
+
+    # Nodes with the same termination and the same children (by their already
+    # merged index) are equivalent, so number them bottom up and reuse the
+    # number of the first equivalent node seen.
+    registry = {}
+    index_of = {}
+    terminal, max_len, max_points = [0], [0], [0]
+    children = array("I", bytes(4*ALPHABET_LEN))
+    stack = [(trie, False)]
+    while stack:
+        node, children_done = stack.pop()
+        edges = [(char, child) for char, child in node.items() if char in CHAR_INDEX]
+        if not children_done:
+            stack.append((node, True))
+            stack += [(child, False) for _, child in edges]
+            continue
+        edges = tuple((char, index_of[id(child)]) for char, child in edges)
+        signature = ("" in node, tuple(sorted(edges)))
+        if signature not in registry:
+            registry[signature] = len(terminal)
+            terminal.append(1 if "" in node else 0)
+            row = [0] * ALPHABET_LEN
+            for char, child in edges:
+                row[CHAR_INDEX[char]] = child
+            children.extend(row)
+            max_len.append(max([max_len[child] + 1 for _, child in edges], default=0))
+            max_points.append(max([max_points[child] + Letter.char_to_points[char] for char, child in edges], default=0))
+        index_of[id(node)] = registry[signature]
+    return Dawg(index_of[id(trie)], children, array("B", terminal), array("B", max_len), array("H", max_points))
+
+def load_dawg(path: str = DAWG_PATH) -> Dawg:
+    '''Memory-maps a file written by Dawg.save. The arrays are views straight
+    into the mapping, so nothing is parsed or copied.'''
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, node_count, root = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        buffer.close()
+        raise ValueError(f"{path} is not a version {VERSION} DAWG file")
+    if sys.byteorder == "big":
+        buffer.close()
+        raise ValueError("DAWG files are little-endian and can only be mapped on little-endian machines")
+    view = memoryview(buffer)
+    arrays = []
+    offset = HEADER.size
+    for fmt, length in [("I", node_count*ALPHABET_LEN), ("H", node_count), ("B", node_count), ("B", node_count)]:
+        size = struct.calcsize(fmt) * length
+        arrays.append(view[offset:offset + size].cast(fmt))
+        offset += size
+    children, max_points, terminal, max_len = arrays
+    return Dawg(root, children, terminal, max_len, max_points, buffer)
+
+if __name__ == "__main__":
+    from dictionary import build_dictionary
+    path = sys.argv[1] if len(sys.argv) > 1 else DAWG_PATH
+    dawg = build_dawg(build_dictionary())
+    dawg.save(path)
+    print(f"Saved a DAWG with {len(dawg)} nodes to '{path}'")
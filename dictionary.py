@@ -1,29 +1,259 @@
+import gzip
+import hashlib
+import heapq
+import os
+import pickle
+import struct
+
 LANGUAGES = [] # English language variants that extend the dictionary: american, australian, british, canadian and english
 DICTIONARY_LEVEL = 70 # Dictionary level that increase the number of words: 10, 20, 35, 40, 50, 55, 60 or 70
+CACHE_DIR = '.cache' # Where the filtered words and built trie are kept between runs
+EXTRA_WORDLISTS = [] # Wordlist files of words to add, like a tournament's additions
+BANNED_WORDLISTS = [] # Wordlist files of words to leave out, like a tournament's bans
 
 levels = [10, 20, 35, 40, 50, 55, 60, 70]
 assert(DICTIONARY_LEVEL in levels)
 
+PROFANITIES_PATH = 'dictionary/profanities.txt'
+
+# Wordlist files can be plain text or gzip'd text, one word per line, or a
+# sorted binary word file from write_word_file. Word files start with the
+# magic and word count, then each word is stored as how many of its leading
+# letters it shares with the word before, how many letters follow, and those
+# letters.
+WORD_FILE_SUFFIX = '.words'
+WORD_FILE_MAGIC = b"WRDS"
+WORD_FILE_HEADER = struct.Struct("<4sI")
+
 def build_dictionary():
-    '''Get a list of English dictionary words. Based on the wordlist-english 
+    '''Get a list of English dictionary words. Based on the wordlist-english
     package used by SpellCast, with profanities filtered.'''
-    profanities = get_profanity_set()
-    word_list = []
+    return list(iter_dictionary())
+
+def iter_dictionary():
+    '''Yields the dictionary's words in sorted order, each once, leaving out
+    profanities and banned words. The sorted wordlists are merged as they
+    are read, so a word in several of them comes up several times in a row
+    and only needs comparing with the word before.'''
+    banned = get_banned_set()
+    previous = None
+    for word in heapq.merge(*[sorted_words(path) for path in get_wordlist_paths() + EXTRA_WORDLISTS]):
+        if word == previous: continue
+        previous = word
+        if word in banned or not is_all_alpha(word): continue
+        yield word
+
+def sorted_words(path: str):
+    '''The words of a wordlist file in sorted order. The bundled wordlists and
+    word files are sorted already and are read as they are used, anything
+    else, like a custom list, is sorted in memory.'''
+    if is_sorted(read_words(path)):
+        return read_words(path)
+    return iter(sorted(read_words(path)))
+
+def is_sorted(words) -> bool:
+    previous = ""
+    for word in words:
+        if word < previous: return False
+        previous = word
+    return True
+
+def stream_trie(paths: list = None, banned: set = None) -> dict:
+    '''Builds the same dict trie as trie.construct_trie_dic(build_dictionary()),
+    inserting each word as it is read instead of listing them all first.
+    A word read twice just ends at the same node again, so no set of seen
+    words is needed, and sorted word files only walk the letters that differ
+    from the word before.'''
+    paths = get_wordlist_paths() + EXTRA_WORDLISTS if paths is None else paths
+    banned = get_banned_set() if banned is None else banned
+    root = {}
+    for path in paths:
+        if path.endswith(WORD_FILE_SUFFIX):
+            # Nodes along the word before, so a shared prefix isn't walked again
+            nodes = [root]
+            word = ""
+            for shared, suffix in read_word_file_entries(path):
+                word = word[:shared] + suffix
+                del nodes[shared+1:]
+                if word in banned or not is_all_alpha(word): continue
+                if not word.islower():
+                    # Only write_word_file's files are sure to be lower case.
+                    # Upper case letters aren't walked, so start again from
+                    # the root.
+                    del nodes[1:]
+                    trie = root
+                    for letter in word.lower():
+                        if letter not in trie:
+                            trie[letter] = {}
+                        trie = trie[letter]
+                    trie[""] = None
+                    continue
+                # Words left out aren't walked, so the nodes may stop short
+                # of the shared prefix
+                trie = nodes[-1]
+                for letter in word[len(nodes)-1:]:
+                    if letter not in trie:
+                        trie[letter] = {}
+                    trie = trie[letter]
+                    nodes.append(trie)
+                trie[""] = None
+        else:
+            for word in read_words(path):
+                if word in banned or not is_all_alpha(word): continue
+                trie = root
+                for letter in word.lower():
+                    if letter not in trie:
+                        trie[letter] = {}
+                    trie = trie[letter]
+                trie[""] = None
+    return {"": root}
+
+def read_words(path: str):
+    '''Yields the words of a wordlist file, in any of the formats above'''
+    if path.endswith(WORD_FILE_SUFFIX):
+        yield from read_word_file(path)
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        for line in f:
+            word = line.strip()
+            if word: yield word
+
+def read_word_file_entries(path: str):
+    '''Yields (letters shared with the word before, letters after those) for
+    each word of a word file'''
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, count = WORD_FILE_HEADER.unpack_from(data)
+    if magic != WORD_FILE_MAGIC:
+        raise ValueError(f"'{path}' is not a word file")
+    i = WORD_FILE_HEADER.size
+    for _ in range(count):
+        shared, length = data[i], data[i+1]
+        yield shared, data[i+2:i+2+length].decode('ascii')
+        i += 2 + length
+
+def read_word_file(path: str):
+    word = ""
+    for shared, suffix in read_word_file_entries(path):
+        word = word[:shared] + suffix
+        yield word
+
+def write_word_file(words, path: str) -> int:
+    '''Writes the words that can be played, lower cased and a-z only, to a
+    sorted word file. Returns how many were written.'''
+    words = sorted({word.lower() for word in words if word.isascii() and is_all_alpha(word)})
+    previous = ""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(WORD_FILE_HEADER.pack(WORD_FILE_MAGIC, len(words)))
+        for word in words:
+            shared = len(os.path.commonprefix([previous, word]))
+            suffix = word[shared:].encode('ascii')
+            if shared > 255 or len(suffix) > 255:
+                raise ValueError(f"'{word}' is too long for a word file")
+            f.write(bytes([shared, len(suffix)]) + suffix)
+            previous = word
+    os.replace(tmp_path, path)
+    return len(words)
+
+def get_wordlist_paths():
+    '''Wordlist files for the configured languages and level, in load order'''
+    paths = []
     for level in levels:
         if level > DICTIONARY_LEVEL: break
         for lang in LANGUAGES + ["english"]:
-            with open(f'dictionary/{lang}-words.{str(level)}') as f:
-                word_list += [word for word in f.read().splitlines() if is_all_alpha(word) and word not in profanities]
-    return word_list
+            paths.append(f'dictionary/{lang}-words.{str(level)}')
+    return paths
 
 def get_profanity_set():
-    with open('dictionary/profanities.txt') as f:
+    with open(PROFANITIES_PATH) as f:
         return set([word for word in f.read().splitlines() if is_all_alpha(word)])
 
+def get_banned_set():
+    '''Profanities and the words of BANNED_WORDLISTS'''
+    banned = get_profanity_set()
+    for path in BANNED_WORDLISTS:
+        banned.update(read_words(path))
+    return banned
+
 def is_all_alpha(word):
-    '''Checks if a word contains only chars a-z'''    
-    return all([l.isalpha() for l in word])
+    '''Checks if a word contains only chars a-z'''
+    return word.isalpha()
+
+def get_cache_key():
+    '''Identifies the dictionary built from the current settings and the current
+    contents of its source files'''
+    key = hashlib.sha256(repr((sorted(LANGUAGES), DICTIONARY_LEVEL, EXTRA_WORDLISTS, BANNED_WORDLISTS)).encode())
+    for path in get_wordlist_paths() + EXTRA_WORDLISTS + BANNED_WORDLISTS + [PROFANITIES_PATH]:
+        with open(path, 'rb') as f:
+            key.update(path.encode())
+            key.update(hashlib.sha256(f.read()).digest())
+    return key.hexdigest()[:16]
+
+def get_cache_paths(key=None):
+    '''Returns the cached word list and trie paths for a cache key'''
+    key = key or get_cache_key()
+    return os.path.join(CACHE_DIR, f'words-{key}.pickle'), os.path.join(CACHE_DIR, f'trie-{key}.dawg')
+
+def load_dictionary():
+    '''Same words as build_dictionary, read from the cache when it is up to date
+    and rebuilt into it otherwise'''
+    words_path, _ = get_cache_paths()
+    if not os.path.exists(words_path):
+        cache_words(words_path)
+    with open(words_path, 'rb') as f:
+        return pickle.load(f)
+
+def load_trie():
+    '''Memory-maps the cached DAWG of the dictionary, rebuilding it first if the
+    cache is missing or out of date. It can be walked like the dict trie.'''
+    from dawg import load_dawg
+    _, trie_path = get_cache_paths()
+    if not os.path.exists(trie_path):
+        cache_trie(trie_path)
+    return load_dawg(trie_path)
+
+def prewarm_cache():
+    '''Builds the word list and trie for the current settings into the cache.
+    Returns the cache paths.'''
+    words_path, trie_path = get_cache_paths(get_cache_key())
+    cache_words(words_path)
+    cache_trie(trie_path)
+    return words_path, trie_path
+
+# Both write to a temporary file and rename over, so workers starting at the
+# same time never read a half-written cache
+
+def cache_words(words_path: str):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f'{words_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(build_dictionary(), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, words_path)
+
+def cache_trie(trie_path: str):
+    '''Builds the DAWG as the words are read, without listing them first'''
+    from dawg import build_dawg
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f'{trie_path}.{os.getpid()}.tmp'
+    build_dawg(iter_dictionary()).save(tmp_path)
+    os.replace(tmp_path, trie_path)
 
 if __name__ == "__main__":
-    dic = build_dictionary()
-    print(len(dic))
+    import argparse
+    parser = argparse.ArgumentParser(description="Builds the dictionary word list.")
+    parser.add_argument("--prewarm", action="store_true", help="build the cached word list and trie for the current settings")
+    parser.add_argument("--word-file", help=f"write the current dictionary to a sorted binary word file, named *{WORD_FILE_SUFFIX}")
+    args = parser.parse_args()
+    if args.prewarm:
+        for path in prewarm_cache():
+            print(f"Saved '{path}'")
+    elif args.word_file:
+        if not args.word_file.endswith(WORD_FILE_SUFFIX):
+            parser.error(f"word files are read by their {WORD_FILE_SUFFIX} suffix")
+        count = write_word_file(iter_dictionary(), args.word_file)
+        print(f"Saved {count} words to '{args.word_file}'")
+    else:
+        dic = build_dictionary()
+        print(len(dic))
@@ -7,9 +7,13 @@ import os
 import pytesseract
 import cv2
 import re
-from letter import Letter
+from letter import Letter, NEIGHBOURS
+from template_ocr import get_reader
+import instrumentation
+from instrumentation import timed
 from multiprocessing import Pool
 from itertools import repeat
+from copy import copy
 from collections import namedtuple
 import numpy as np
 
@@ -24,90 +28,193 @@ LETTER_VERT_TRIM_PERCENT = 0.10
 # mapping to correct incorrect detections
 LETTER_SUBSTITUTIONS = {'0': 'o', '': 'i', '2':'z', '5':'s'}
 
-NUM_PROCS = 8
+# Default number of OCR processes, see also ocr_service.OcrService
+NUM_PROCS = os.cpu_count() or 8
+
+# "tesseract" runs the tesseract binary on each tile, "template" matches the
+# tiles against bitmasks/ in this process
+OCR_BACKENDS = ("tesseract", "template")
+
+# Tile detection. Pixels this close to white are tile, rows with fewer
+# white pixels than this fraction of the whitest row are gaps, and gaps this
+# small a fraction of the image are anti-aliasing inside a tile.
+WHITE_TOLERANCE = 5
+MIN_TILE_ROW_FRACTION = 0.05
+MAX_SPLIT_GAP_FRACTION = 0.01
 
 class GameBoard:
     '''Represents the state of a game board'''
 
-    def __init__(self, image_path):
-        '''Creates a game board based on a provided image'''
-        self.image = cv2.imread(image_path)
-        self.tile_bounds = self.find_tile_bounds(self.image)
-        letter_bounds = self.find_letter_bounds(self.tile_bounds)
+    def __init__(self, image_path, num_swaps=None, processes=NUM_PROCS, ocr="tesseract", ocr_service=None, ocr_cache=None):
+        '''Creates a game board based on a provided image. Asks for the number of
+        swaps unless given. With processes <= 1 the tiles are read one after
+        another in this process, which works inside daemonic pool workers. An
+        ocr_service reads them with its long-lived workers instead. The
+        template backend doesn't use either, and also reads the multipliers
+        and a confidence for each tile into self.confidences. With an
+        ocr_cache (see solve_cache.OcrCache), a screenshot read before is not
+        read again.'''
+        if ocr not in OCR_BACKENDS:
+            raise ValueError(f"Unknown OCR backend '{ocr}', expected one of {OCR_BACKENDS}")
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+        self.image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        cache_key = None if ocr_cache is None else ocr_cache.key(image_bytes, ocr)
+        cached = None if cache_key is None else ocr_cache.get(cache_key)
+        if cached is not None:
+            self.tile_bounds, letters, self.confidences = cached
+            # Each board gets its own Letters, so changing its tiles doesn't change the cached ones
+            letters = [copy(letter) for letter in letters]
+        else:
+            self.tile_bounds, letters, self.confidences = self.read_image(ocr, processes, ocr_service)
+            if cache_key is not None:
+                # The cache keeps copies for the same reason
+                ocr_cache.put(cache_key, (self.tile_bounds, [copy(letter) for letter in letters], self.confidences))
         self.grid = [[]]
-        #self.letter_bitmasks, self.multiplier_bitmasks = GameBoard.read_in_bitmasks()
-        assert(len(letter_bounds) == 25)
-        
-        # ocr everything in parallel
-        letters = []
-        with Pool(processes=NUM_PROCS) as pool:
-           letters = pool.starmap(self.read_tile, zip(repeat(self.image), letter_bounds, range(len(letter_bounds))))
         for _, letter in enumerate(letters):
             if len(self.grid[-1]) == 5: self.grid.append([])
             self.grid[-1].append(letter)
         self.graph = GameBoard.construct_graph_from_grid(self.grid)
         
-        self.num_swaps = int(input("How many swaps can you perform: "))
+        self.num_swaps = int(input("How many swaps can you perform: ")) if num_swaps is None else num_swaps
         if self.num_swaps > 3:
             print("WARN: It should not be possible to have more than three swaps. Continuing, but this will be slow.")
     
+    def read_image(self, ocr, processes, ocr_service):
+        '''OCRs self.image, returning the tile bounds, a Letter for each tile and
+        the template backend's confidences'''
+        tile_bounds = self.find_tile_bounds(self.image)
+        letter_bounds = self.find_letter_bounds(tile_bounds)
+        assert(len(letter_bounds) == 25)
+
+        # ocr everything in parallel
+        letters = []
+        confidences = None
+        if ocr == "template":
+            readings = get_reader().read_tiles(self.image, tile_bounds, letter_bounds)
+            letters = [Letter(r.char, 0, r.multiplier, r.does_double_word, GameBoard.get_position(n), False) for n, r in enumerate(readings)]
+            confidences = [r.confidence for r in readings]
+        elif ocr_service is not None:
+            letters = ocr_service.read_tiles(self.image, letter_bounds)
+        elif processes <= 1:
+            letters = [self.read_tile(self.image, bound, n) for n, bound in enumerate(letter_bounds)]
+        else:
+            with Pool(processes=processes) as pool:
+                tasks = zip(repeat(self.image), letter_bounds, range(len(letter_bounds)))
+                if instrumentation.CURRENT is None:
+                    letters = pool.starmap(self.read_tile, tasks)
+                else:
+                    # The workers time their read_letter calls and send the timings back
+                    results = pool.starmap(instrumentation.call_recorded, ((self.read_tile, *task) for task in tasks))
+                    letters = instrumentation.merge_recorded(results)
+        return tile_bounds, letters, confidences
+
+    @classmethod
+    def from_letters(cls, letters: str, num_swaps: int = 0, diamonds=(), double_letter=None, triple_letter=None, double_word=None):
+        '''Creates a game board from the 25 letters read left to right, top to
+        bottom. Modifiers are given as (x, y) tile positions, with the origin at
+        the top left tile. Skips OCR, so there is no image and no tile bounds.'''
+        if len(letters) != BOARD_SIDE_LEN*BOARD_SIDE_LEN:
+            raise ValueError(f"Expected {BOARD_SIDE_LEN*BOARD_SIDE_LEN} letters, got {len(letters)} in '{letters}'")
+        diamonds = set(tuple(position) for position in diamonds)
+        multipliers = {}
+        if double_letter is not None: multipliers[tuple(double_letter)] = 2
+        if triple_letter is not None: multipliers[tuple(triple_letter)] = 3
+        double_word = None if double_word is None else tuple(double_word)
+        board = cls.__new__(cls)
+        board.image = None
+        board.tile_bounds = None
+        board.grid = [[]]
+        for i, char in enumerate(letters.lower()):
+            if len(board.grid[-1]) == BOARD_SIDE_LEN: board.grid.append([])
+            position = GameBoard.get_position(i)
+            board.grid[-1].append(Letter(char, position in diamonds, multipliers.get(position, 1), position == double_word, position, False))
+        board.graph = GameBoard.construct_graph_from_grid(board.grid)
+        board.num_swaps = num_swaps
+        return board
+
     def get_position(i):
         return (i%BOARD_SIDE_LEN, i//BOARD_SIDE_LEN)
     
+    @classmethod
+    def from_string(cls, text: str, num_swaps: int = 0):
+        '''Creates a game board from the same lines read_board_manually asks
+        for, separated by newlines or "/":
+            letters, 25 chars left to right, top to bottom
+            diamonds, 25 chars of y or n
+            double word, triple letter and double letter coordinates as "x y"
+            number of swaps
+        Lines after the letters can be blank or left off, and a blank number of
+        swaps is num_swaps. See the bottom of this file for an example.'''
+        lines = text.strip().replace("/", "\n").split("\n")
+        lines += [""] * (6 - len(lines))
+        letters, diamonds, dw, tl, dl, swaps = [line.strip() for line in lines[:6]]
+        return cls.from_dict({
+            "letters": letters,
+            "diamonds": diamonds,
+            "dw": GameBoard.parse_coordinate(dw),
+            "tl": GameBoard.parse_coordinate(tl),
+            "dl": GameBoard.parse_coordinate(dl),
+            "swaps": int(swaps) if swaps else num_swaps,
+        })
+
+    @classmethod
+    def from_dict(cls, board: dict):
+        '''Creates a game board from a dict with the 25 "letters", and optionally
+        "swaps", "diamonds" (a list of [x, y] positions or 25 chars of y/n) and
+        the "dl", "tl" and "dw" positions as [x, y]'''
+        diamonds = board.get("diamonds") or ()
+        if isinstance(diamonds, str):
+            if len(diamonds) != BOARD_SIDE_LEN*BOARD_SIDE_LEN:
+                raise ValueError(f"Expected a y or n for each of the 25 tiles, got '{diamonds}'")
+            diamonds = [GameBoard.get_position(i) for i, char in enumerate(diamonds.lower()) if char == "y"]
+        return cls.from_letters(board["letters"], board.get("swaps") or 0, diamonds=diamonds,
+                                double_letter=board.get("dl"), triple_letter=board.get("tl"), double_word=board.get("dw"))
+
+    def parse_coordinate(coord: str):
+        '''Reads an "x y" or "x,y" coordinate, or None if blank'''
+        if not coord.strip(): return None
+        x, y = [int(value) for value in coord.replace(",", " ").split()]
+        if not (0 <= x < BOARD_SIDE_LEN and 0 <= y < BOARD_SIDE_LEN):
+            raise ValueError(f"Coordinate '{coord}' is off the board")
+        return (x, y)
+
     def read_letters_manually():
+        '''Asks for the letters and modifiers on stdin instead of reading them
+        from an image. Returns a Letter for each tile, left to right, top to
+        bottom.'''
+        return GameBoard.from_string("\n".join(GameBoard.ask_for_tiles())).tiles()
+
+    def read_board_manually():
+        '''Asks for the whole board, swaps included, on stdin'''
+        lines = GameBoard.ask_for_tiles()
+        lines.append(input("How many swaps can you perform: "))
+        return GameBoard.from_string("\n".join(lines))
+
+    def ask_for_tiles():
+        '''Asks for the lines of from_string before the number of swaps'''
         print("All inputs should be read from the board going left to right, top to bottom.")
         print("Inputs, should have no separator (spaces, commas, etc)")
-        all_letters = input("Enter all 25 letters on the board: ")
-        all_letters = all_letters.lower()
-        Letters = []
-        for i, letter in enumerate(all_letters):
-            Letters.append(Letter(letter, 0, 1, False, GameBoard.get_position(i), False))
-        all_diamonds = input("y if a diamond is present, n otherwise for all 25 tiles on the board: ")
-        all_diamonds = [True if "y" else False for char in all_diamonds]
-        for letter, has_diamond in zip(Letters, all_diamonds):
-            letter.has_diamond = has_diamond
+        lines = [input("Enter all 25 letters on the board: ")]
+        lines.append(input("y if a diamond is present, n otherwise for all 25 tiles on the board: "))
         print("For X and Y coordinates, the origin is the top left tile. eg:(2 4)")
         print("Leave blank if not present")
-        def get_letter(coord):
-            x,y = int(coord[0]), int(coord[2])
-            return Letters[x+BOARD_SIDE_LEN*y]
-        dw = input("Coordinate of double word tile: ")
-        if dw:
-            get_letter(dw).does_double_word = True
-        tl = input("Coordinate of triple letter tile: ")
-        if tl:
-            get_letter(tl).multiplier = 2
-        dl = input("Coordinate of double letter tile: ")
-        if dl:
-            get_letter(dl).multiplier = 3
-        return Letters
-    
-    def read_in_bitmasks():
-        letter_bitmasks = {}
-        multiplier_bitmasks = {}
-        for file_name in os.listdir("bitmasks"):
-            im = cv2.imread(f'bitmasks/{file_name}')
-            # drop the color dimension
-            im = im[:,:,0]
-            file_name = file_name.replace(".png","")
-            if len(file_name)>1:
-                multiplier_bitmasks[file_name] = im
-            else:
-                letter_bitmasks[file_name] = im
-        return (letter_bitmasks, multiplier_bitmasks)
+        lines.append(input("Coordinate of double word tile: "))
+        lines.append(input("Coordinate of triple letter tile: "))
+        lines.append(input("Coordinate of double letter tile: "))
+        return lines
     
+    @timed("construct_graph_from_grid")
     def construct_graph_from_grid(letters: list):
-        graph = {}
-        for i in range(BOARD_SIDE_LEN):
-            for j in range(BOARD_SIDE_LEN):
-                adjacents = []
-                for k in [-1, 0, 1]:
-                    for l in [-1, 0, 1]:
-                        x, y = i+k, j+l
-                        if x>0 and y>0 and x<BOARD_SIDE_LEN and y<BOARD_SIDE_LEN:
-                            adjacents.append(letters[x][y])
-                graph[letters[i][j]] = adjacents
-        return graph
+        '''Each Letter mapped to the Letters around it. The solvers use
+        NEIGHBOURS and tile numbers instead, this is for walking the board by
+        Letter.'''
+        tiles = [letter for row in letters for letter in row]
+        return {letter: [tiles[neighbour] for neighbour in NEIGHBOURS[tile]] for tile, letter in enumerate(tiles)}
+
+    def tiles(self) -> list:
+        '''The board's Letters indexed by tile number'''
+        return [letter for row in self.grid for letter in row]
 
     def __str__(self):
         edge = "-"*(BOARD_SIDE_LEN*2+1) + '\n'
@@ -120,32 +227,6 @@ class GameBoard:
             str += '\n' + edge
         return str
     
-    def read_text_w_bitmasks(text_image, bitmasks):
-        '''Return None or empty string if nothing is found'''
-        # run image through bitmask
-        matches = []
-        for char, mask in bitmasks.items():
-            # Size of the mask must be bigger than the size of the image, otherwise sliding window
-            # is impossible.
-            if mask.shape > text_image.shape:
-                continue
-            window_view = np.lib.stride_tricks.sliding_window_view(text_image, mask.shape)
-            # Get the absolute difference in brightness levels
-            abs_diffs = np.abs(window_view - mask)
-            # Sum across each place that the window was placed on the image
-            summed_diffs = np.sum(abs_diffs, axis=(2,3))
-            # Find the lowest diff in any window
-            min_diff = np.min(summed_diffs)
-            matches.append((char, min_diff))
-        
-        def debug_print_arr(arr):
-            val = ""
-            for row in arr:
-                val += "".join(["." if x < 10 else "#" for x in row]) + "\n"
-            return val
-        pdb.set_trace()
-        return sorted(matches, key=lambda x: x[1])[0][0].lower()
-    
     # Doesn't work with multiprocessing
     def read_text_w_easy_ocr(text_image, reader, n):
         res = reader.readtext(text_image)
@@ -182,6 +263,7 @@ class GameBoard:
             return
         cv2.imwrite(name, img)
 
+    @timed("read_letter")
     def read_letter(self, image, bound, n):
         '''Reads the letter in the middle of the tile'''
         # crop image
@@ -247,11 +329,15 @@ class GameBoard:
         multiplier, does_double_word = 1, False
         return Letter(letter, 0, multiplier, does_double_word, position, False)
 
+    @timed("find_tile_bounds")
     def find_tile_bounds(self, image):
         '''Finds the approximate region of the tiles. Represents regions as the low
         and high y, then low and high x'''
-        vertical_breakpoints = self.find_breakpoints(image, axis=0)
-        horizontal_breakpoints = self.find_breakpoints(image, axis=1)
+        # Pixels this close to white count as tile
+        near_white = 255 - WHITE_TOLERANCE
+        white = cv2.inRange(image, (near_white,)*3, (255,)*3) > 0
+        vertical_breakpoints = self.find_breakpoints(white, axis=0)
+        horizontal_breakpoints = self.find_breakpoints(white, axis=1)
 
         squares = []
         for lo_y, hi_y in vertical_breakpoints:
@@ -277,40 +363,39 @@ class GameBoard:
         assert(new_pair[0] < new_pair[1])
         return new_pair
 
-    def find_breakpoints(self, image, axis):
-        '''Find the pixel locations of tiles in a grid'''
-        h, w, _ = image.shape
-        white = (255, 255, 255)
-        breakpoints = []
-        in_tile = False
-        for a in range(h if axis == 0 else w):
-            seen_tile = False
-            for b in range(w if axis == 0 else h):
-                b, g, r = image[a][b] if axis == 0 else image[b][a]
-                if (r, g, b) == white:
-                    seen_tile = True
-                    if not in_tile:
-                        # found the tile colour, must be a tile
-                        in_tile = True
-                        seen_tile = True
-                        breakpoints.append(a)
-                    break
-            if in_tile and not seen_tile:
-                # no tile edges for a whole row/column, must be a gap
-                in_tile = False
-                breakpoints.append(a)
-
-        assert(len(breakpoints) == 10)
-        return self.array_to_pairs(breakpoints)
-
-    def array_to_pairs(self, arr):
-        return [(arr[i], arr[i+1]) for i in range(0, len(arr), 2)]
+    def find_breakpoints(self, white, axis):
+        '''Find the pixel locations of tiles in a grid from a mask of the white
+        pixels. Returns (lo, hi) pairs of rows for axis 0 and of columns for
+        axis 1, hi being one past the tile.'''
+        # Project the mask onto the axis: how many white pixels each row (or
+        # column) has. Rows crossing tiles have lots, gaps have none.
+        counts = np.count_nonzero(white, axis=1 if axis == 0 else 0)
+        in_tile = counts >= max(1, counts.max() * MIN_TILE_ROW_FRACTION)
+
+        # Starts and ends of the runs of tile rows
+        edges = np.diff(np.concatenate(([0], in_tile.astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            raise ValueError(f"No tiles found along axis {axis}")
+
+        # Anti-aliasing can drop a row or two inside a tile, which splits it in two
+        max_gap = len(counts) * MAX_SPLIT_GAP_FRACTION
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] > max_gap))
+        starts, ends = starts[keep], ends[np.concatenate((keep[1:], [True]))]
+
+        # Whatever else is left, specks and UI text, is much thinner than a tile
+        if len(starts) > BOARD_SIDE_LEN:
+            longest = np.sort(np.argsort(ends - starts, kind="stable")[-BOARD_SIDE_LEN:])
+            starts, ends = starts[longest], ends[longest]
+        if len(starts) != BOARD_SIDE_LEN:
+            raise ValueError(f"Found {len(starts)} rows of tiles along axis {axis}, expected {BOARD_SIDE_LEN}")
+        return list(zip(starts.tolist(), ends.tolist()))
 
     def get_grayscale(self, image):
         return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-# The text below can be used for manual input
-'''
+# The text below can be used for manual input, or passed to GameBoard.from_string
+EXAMPLE_BOARD = '''
 uuifioplgzreiilotdioaqyio
 yyynnnynnnynynynnnynnnyyn
 4 0
@@ -0,0 +1,133 @@
+'''Opt-in counters, timers and profiles for finding out where a solve's time
+goes.
+
+Nothing is recorded unless inside `with record() as stats:`. Then every
+engine counts the nodes it expands, the trie misses, the swap branches it
+explores and the words it emits, and the nodes it prunes, and the functions
+marked @timed time each call. Timings taken in OCR worker processes are sent
+back with their results and merged in. Pass
+profile="cprofile" (or "pyinstrument", if installed) to profile the block
+too. Afterwards stats.to_dict() has it all, ready for json.dumps.
+
+Outside record(), the hot paths only check that CURRENT is None once per
+call, and the timers cost one extra function call.'''
+
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from string import ascii_lowercase
+
+PROFILERS = ("cprofile", "pyinstrument")
+# Functions kept in a cProfile report
+PROFILE_LINES = 30
+
+# The Stats being recorded into, or None
+CURRENT = None
+
+class Stats:
+    '''Counters and timings of one recording'''
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        # name -> seconds taken by each call
+        self.timers = defaultdict(list)
+        self.profile = None
+
+    def to_dict(self) -> dict:
+        timers = {name: {"calls": len(times), "seconds": sum(times), "max_seconds": max(times)}
+                  for name, times in self.timers.items()}
+        return {"counters": dict(self.counters), "timers": timers, "profile": self.profile}
+
+    def merge(self, other: "Stats"):
+        '''Adds the counters and timings of other, recorded elsewhere'''
+        for name, count in other.counters.items():
+            self.counters[name] += count
+        for name, times in other.timers.items():
+            self.timers[name] += times
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+@contextmanager
+def record(profile: str = None):
+    '''Records into a new Stats for the duration of the block'''
+    global CURRENT
+    if profile is not None and profile not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profile}', expected one of {PROFILERS}")
+    stats = Stats()
+    previous, CURRENT = CURRENT, stats
+    profiler = start_profiler(profile)
+    try:
+        yield stats
+    finally:
+        if profiler is not None:
+            stats.profile = stop_profiler(profile, profiler)
+        CURRENT = previous
+
+def call_recorded(function, *args):
+    '''Calls function in a recording of its own, for worker processes, which
+    don't see their parent's. Returns the result and the Stats, which the
+    parent merges with merge_recorded.'''
+    with record() as stats:
+        return function(*args), stats
+
+def merge_recorded(results: list) -> list:
+    '''The results of call_recorded calls, merging their Stats into CURRENT'''
+    for _, stats in results:
+        CURRENT.merge(stats)
+    return [result for result, _ in results]
+
+def start_profiler(profile: str):
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if profile == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("Profiling with pyinstrument needs it installed: pip install pyinstrument")
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+def stop_profiler(profile: str, profiler) -> str:
+    '''Returns the profile as text'''
+    if profile == "pyinstrument":
+        profiler.stop()
+        return profiler.output_text()
+    profiler.disable()
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return report.getvalue()
+
+def timed(name: str):
+    '''Decorator timing every call of the function while recording'''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            stats = CURRENT
+            if stats is None: return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats.timers[name].append(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def count_expansion(counters: dict, trie: dict, chars: list, swapping: bool):
+    '''Counts what a search is about to do at a trie node, with chars on the
+    tiles it can step onto next, swapping them too if swapping'''
+    counters["nodes"] += 1
+    swap_chars = sum(char in trie for char in ascii_lowercase) if swapping else 0
+    counters["swap_branches"] += swap_chars * len(chars)
+    counters["trie_misses"] += sum(char not in trie for char in chars)
+    if "" in trie: counters["words"] += 1
@@ -1,7 +1,24 @@
 BOARD_SIDE_LEN = 5
 
+# Roughly English letter frequencies, for random boards and guessing at the
+# letters that refill the board after a move
+LETTER_FREQUENCIES = {'a':8.2,'b':1.5,'c':2.8,'d':4.3,'e':12.7,'f':2.2,'g':2.0,'h':6.1,'i':7.0,'j':0.2,'k':0.8,'l':4.0,'m':2.4,'n':6.7,'o':7.5,'p':1.9,'q':0.1,'r':6.0,'s':6.3,'t':9.1,'u':2.8,'v':1.0,'w':2.4,'x':0.2,'y':2.0,'z':0.1}
+
+def neighbour_table(side: int = BOARD_SIDE_LEN) -> tuple:
+    '''For each tile number, the tile numbers of the up to 8 tiles around it'''
+    neighbours = []
+    for tile in range(side * side):
+        row, col = divmod(tile, side)
+        neighbours.append(tuple((row + k) * side + col + l for k in [-1, 0, 1] for l in [-1, 0, 1]
+                                if (k or l) and 0 <= row + k < side and 0 <= col + l < side))
+    return tuple(neighbours)
+
+NEIGHBOURS = neighbour_table()
+
 class Letter:
-    '''Represents a letter on the game board'''
+    '''Represents a letter on the game board. Boards and paths hold a lot of
+    these, so they have slots instead of a __dict__.'''
+    __slots__ = ("char", "swapped_letter", "points", "has_diamond", "does_double_word", "position", "tile_number")
     char_to_points = {'a':1,'b':4,'c':5,'d':3,'e':1,'f':5,'g':3,'h':4,'i':1,'j':7,'k':6,'l':3,'m':4,'n':2,'o':1,'p':4,'q':8,'r':2,'s':2,'t':2,'u':4,'v':5,'w':5,'x':7,'y':4,'z':8}
     assert(len(char_to_points) == 26)
 
@@ -21,13 +38,10 @@ class Letter:
         self.position = position
         col, row = position
         self.tile_number = row * BOARD_SIDE_LEN + col
-        # We use this bool to track whether the letter is used up when searching
-        # for the best word on the board.
-        self.used_up = False
     
     # Hash and Eq only depend on the position of the letter
     def __hash__(self):
-        return hash(self.position) + hash(self.swapped_letter)
+        return self.tile_number * 2 + self.swapped_letter
     def __eq__(self, other):
         if not isinstance(other, type(self)): return NotImplemented
         return self.position == other.position and self.swapped_letter == other.swapped_letter
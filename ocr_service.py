@@ -0,0 +1,77 @@
+'''Tesseract OCR workers that stay up between boards.
+
+GameBoard on its own starts a new pool for every board and pickles the whole
+screenshot for every tile it sends to it. An OcrService starts its workers
+once, and hands them each screenshot through a shared buffer, so a tile task
+is only the tile's bounds.'''
+
+from threading import Lock
+from multiprocessing import get_context
+import numpy as np
+from game_board import GameBoard, NUM_PROCS
+import instrumentation
+
+# Enough for a 4K screenshot. A bigger one restarts the workers with a buffer
+# that fits it.
+IMAGE_BUFFER_BYTES = 3840 * 2160 * 3
+
+# Set in each worker by init_worker
+BUFFER = None
+READER = None
+
+def init_worker(buffer):
+    global BUFFER, READER
+    BUFFER = buffer
+    # read_tile doesn't use any board state, so any GameBoard will do
+    READER = GameBoard.__new__(GameBoard)
+
+def read_shared_tile(task: tuple):
+    '''Reads one tile of the screenshot currently in the shared buffer. When
+    the caller is recording, returns it with the Stats of reading it.'''
+    shape, bound, n, recording = task
+    size = int(np.prod(shape))
+    image = np.frombuffer(BUFFER, dtype=np.uint8, count=size).reshape(shape)
+    if recording:
+        return instrumentation.call_recorded(READER.read_tile, image, bound, n)
+    return READER.read_tile(image, bound, n)
+
+class OcrService:
+    '''A pool of OCR workers sharing one image buffer. Boards are read one at a
+    time, and callers on other threads wait their turn. Use as a context
+    manager, or call close.'''
+
+    def __init__(self, processes: int = NUM_PROCS, buffer_bytes: int = IMAGE_BUFFER_BYTES):
+        self.processes = processes
+        self.lock = Lock()
+        self.pool = None
+        self.start(buffer_bytes)
+
+    def start(self, buffer_bytes: int):
+        if self.pool is not None: self.close()
+        context = get_context()
+        self.buffer = context.RawArray("B", buffer_bytes)
+        self.pool = context.Pool(processes=self.processes, initializer=init_worker, initargs=(self.buffer,))
+
+    def read_tiles(self, image, letter_bounds: list) -> list:
+        '''Returns a Letter for each letter bound of a BGR screenshot'''
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        with self.lock:
+            if image.nbytes > len(self.buffer):
+                self.start(image.nbytes)
+            np.frombuffer(self.buffer, dtype=np.uint8, count=image.nbytes)[:] = image.ravel()
+            recording = instrumentation.CURRENT is not None
+            letters = self.pool.map(read_shared_tile, [(image.shape, bound, n, recording) for n, bound in enumerate(letter_bounds)])
+        return instrumentation.merge_recorded(letters) if recording else letters
+
+    def read_board(self, image_path: str, num_swaps=None) -> GameBoard:
+        return GameBoard(image_path, num_swaps=num_swaps, ocr_service=self)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,93 @@
+'''Splits the search for one board across processes.
+
+Boards with 2 or 3 swaps branch 26 ways at every step, so a single solve can
+take many seconds on one core. The search tree is cut up by the start tile and
+the tile stepped onto first, every piece is searched with the bitmask engine in
+a pool worker, and the workers' top N lists are merged. Workers also share the
+best threshold any of them has reached, so pruning in one piece benefits from
+good words found in the others.'''
+
+from multiprocessing import get_all_start_methods, get_context
+from algorithm import BitmaskSearch, TopN, TOP_N
+from game_board import NUM_PROCS
+from trie import BOUND_KEY, annotate_bounds
+from letter import NEIGHBOURS
+
+# The trie pool workers search, here and in batch.py. With fork, TRIE is set
+# before the pool starts and is inherited copy-on-write.
+TRIE = None
+THRESHOLD = None
+
+def load_worker_trie():
+    '''Without fork, each worker maps the cached trie, which the OS still
+    shares between them through the page cache'''
+    global TRIE
+    if TRIE is None:
+        from dictionary import load_trie
+        TRIE = load_trie()
+
+def init_worker(threshold):
+    global THRESHOLD
+    THRESHOLD = threshold
+    load_worker_trie()
+
+def search_piece(task: tuple) -> list:
+    board, start_tile, first_step, top_n, pruning = task
+    search = BitmaskSearch(TRIE, board, top_n, pruning, floor=THRESHOLD)
+    return search.search(start_tiles=(start_tile,), first_steps=(first_step,))
+
+def split_search(board) -> list:
+    '''Pieces of the search as (start tile, first step) pairs. Every word of two
+    or more letters falls in exactly one piece. One letter words turn up in
+    every piece of their start tile, and are deduped when merging.'''
+    pieces = []
+    tiles = board.tiles()
+    for letter in tiles:
+        if not letter.char: continue
+        steps = [neighbour for neighbour in NEIGHBOURS[letter.tile_number] if tiles[neighbour].char]
+        # A start tile with nowhere to go still has its one letter word
+        pieces += [(letter.tile_number, step) for step in steps] or [(letter.tile_number, None)]
+    return pieces
+
+class ParallelSolver:
+    '''Keeps a pool of workers that share the trie, to solve boards one at a
+    time across all of them. Use as a context manager, or call close.'''
+
+    def __init__(self, trie: dict, processes: int = NUM_PROCS, pruning: bool = True, top_n: int = TOP_N):
+        global TRIE
+        if pruning and BOUND_KEY not in trie[""]:
+            # Before forking, so workers don't each annotate their own copy
+            annotate_bounds(trie)
+        self.pruning = pruning
+        self.top_n = top_n
+        if "fork" in get_all_start_methods():
+            TRIE = trie
+            context = get_context("fork")
+        else:
+            context = get_context()
+        self.threshold = context.RawValue("i", -1)
+        self.pool = context.Pool(processes=processes, initializer=init_worker, initargs=(self.threshold,))
+
+    def solve(self, board) -> list:
+        '''Returns the top_n solutions worst first, like find_best_word'''
+        self.threshold.value = -1
+        tasks = [(board, start_tile, first_step, self.top_n, self.pruning) for start_tile, first_step in split_search(board)]
+        merged = TopN(self.top_n)
+        for solutions in self.pool.imap_unordered(search_piece, tasks):
+            for solution in solutions:
+                merged.push(solution)
+        return merged.solutions()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+
+def find_best_word_parallel(trie: dict, board, processes: int = NUM_PROCS, pruning: bool = True) -> list:
+    '''find_best_word across a pool of processes started just for this board'''
+    with ParallelSolver(trie, processes, pruning) as solver:
+        return solver.solve(board)
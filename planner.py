@@ -0,0 +1,175 @@
+'''Plans moves over several turns.
+
+find_best_word plays the best word now, which may spend every swap on a few
+extra points that a later turn would have made more of. A Planner looks K
+turns ahead instead: for each candidate move, it plays it out, refills the
+played tiles with random letters drawn by LETTER_FREQUENCIES, and takes the
+best it can expect to score on the boards that follow. Candidate moves are
+the best words using each number of swaps up to the board's, so saving a
+swap is weighed against spending it.
+
+Boards are memoized on their canonical key, so a board reached twice, or
+revisited by a deeper pass, isn't solved again. Passes deepen one turn at a
+time until the time budget runs out, and the plan of the deepest finished
+pass is returned. Run with `python3 planner.py "<board>"`, the board given
+as in GameBoard.from_string.'''
+
+import random
+import time
+from collections import namedtuple
+from copy import copy
+from algorithm import Solution
+from anytime import solve_anytime
+from game_board import GameBoard
+from letter import Letter, LETTER_FREQUENCIES
+from solve_cache import board_key
+
+TURNS = 3
+TIME_BUDGET = 2.0
+# Refills tried for each move, and the moves tried for each number of swaps
+REFILL_SAMPLES = 4
+CANDIDATES = 3
+
+# move is the word to play now. expected_score is what it and the best moves
+# after it can expect to score over turns turns. complete is False when the
+# time budget ran out before looking as far ahead as asked.
+Plan = namedtuple("Plan", "move expected_score turns complete")
+
+class OutOfTime(Exception):
+    '''Raised at the deadline. moves holds the candidate moves found for the
+    board being searched, when moves ran out of time.'''
+    def __init__(self, moves: list = ()):
+        super().__init__()
+        self.moves = list(moves)
+
+def swaps_used(move: Solution) -> int:
+    return sum(letter.swapped_letter for letter in move.path)
+
+def multiplier(letter: Letter) -> int:
+    if letter.char not in Letter.char_to_points: return 1
+    return letter.points // Letter.char_to_points[letter.char]
+
+def play(board, move: Solution, refill: str):
+    '''The board after playing move, with its tiles replaced by the refill
+    letters in tile order. Diamonds on played tiles are used up, letter and
+    word multipliers stay where they are.'''
+    played = {letter.position for letter in move.path}
+    refill = iter(refill)
+    after = GameBoard.__new__(GameBoard)
+    after.image = None
+    after.tile_bounds = None
+    after.grid = []
+    for row in board.grid:
+        after.grid.append([])
+        for letter in row:
+            if letter.position in played:
+                letter = Letter(next(refill), False, multiplier(letter), letter.does_double_word, letter.position, False)
+            after.grid[-1].append(letter)
+    after.graph = GameBoard.construct_graph_from_grid(after.grid)
+    after.num_swaps = board.num_swaps - swaps_used(move)
+    return after
+
+class Planner:
+    '''Plans the move to make on a board, looking up to turns turns ahead
+    within budget seconds. Memoized boards are kept between plans, so reuse a
+    Planner through a game.'''
+
+    def __init__(self, trie: dict, turns: int = TURNS, budget: float = TIME_BUDGET,
+                 samples: int = REFILL_SAMPLES, candidates: int = CANDIDATES, seed: int = 0):
+        self.trie = trie
+        self.turns = turns
+        self.budget = budget
+        self.samples = samples
+        self.candidates = candidates
+        self.seed = seed
+        # board key -> candidate moves, and (board key, turns) -> (expected score, move)
+        self.moves_memo = {}
+        self.values = {}
+
+    def plan(self, board) -> Plan:
+        '''The plan of the deepest pass finished by the deadline. If the first
+        pass, looking one turn ahead, doesn't finish, the move is the best
+        word found by then. Words without swaps are always searched for, so
+        move is only None when the board has no words at all.'''
+        self.deadline = time.perf_counter() + self.budget
+        best = None
+        for turns in range(1, self.turns + 1):
+            try:
+                value, move = self.evaluate(board, turns)
+            except OutOfTime as out_of_time:
+                if best is None:
+                    # Only the first pass's moves(board) can run out of time
+                    # before a plan
+                    move = max(out_of_time.moves, key=lambda move: move.score, default=None)
+                    best = Plan(move, 0 if move is None else move.score, 1, False)
+                break
+            best = Plan(move, value, turns, turns == self.turns)
+        return best
+
+    def evaluate(self, board, turns: int) -> tuple:
+        '''The best expected score over turns turns, and the move that gets it'''
+        key = (board_key(board), turns)
+        if key in self.values: return self.values[key]
+        best = (0, None)
+        for move in self.moves(board):
+            value = move.score
+            if turns > 1:
+                value += self.expected(board, move, turns - 1)
+            if value > best[0]:
+                best = (value, move)
+        self.values[key] = best
+        return best
+
+    def expected(self, board, move: Solution, turns: int) -> float:
+        '''Average best score over turns turns after move, across refills'''
+        # Seeded by the board and move, so the same refills are drawn for them
+        # on every pass
+        positions = ",".join(f"{x}{y}" for x, y in (letter.position for letter in move.path))
+        rng = random.Random(f"{self.seed}/{board_key(board)}/{move.word}/{positions}")
+        total = 0
+        for _ in range(self.samples):
+            if time.perf_counter() > self.deadline:
+                raise OutOfTime()
+            refill = "".join(rng.choices(list(LETTER_FREQUENCIES), weights=list(LETTER_FREQUENCIES.values()), k=len(move.path)))
+            total += self.evaluate(play(board, move, refill), turns)[0]
+        return total / self.samples
+
+    def moves(self, board) -> list:
+        '''The best candidates words using no swaps, then at most one swap, and
+        so on up to the board's swaps'''
+        key = board_key(board)
+        if key in self.moves_memo: return self.moves_memo[key]
+        moves = {}
+        for swaps in range(board.num_swaps + 1):
+            limited = copy(board)
+            limited.num_swaps = swaps
+            # Searches with swaps stop at the deadline. Without, they're quick
+            # enough to always finish.
+            seconds = None if swaps == 0 else self.deadline - time.perf_counter()
+            progress = solve_anytime(self.trie, limited, seconds, self.candidates)
+            for move in progress.solutions:
+                moves[(move.word, move.path)] = move
+            if not progress.finished:
+                raise OutOfTime(moves.values())
+        self.moves_memo[key] = list(moves.values())
+        return self.moves_memo[key]
+
+if __name__ == "__main__":
+    import argparse
+    from algorithm import draw_solution_on_terminal
+    parser = argparse.ArgumentParser(description="Plans the next move looking several turns ahead.")
+    parser.add_argument("board", help="board as in GameBoard.from_string, lines separated by /")
+    parser.add_argument("--turns", type=int, default=TURNS)
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET, help="seconds")
+    parser.add_argument("--samples", type=int, default=REFILL_SAMPLES, help="refills tried per move")
+    args = parser.parse_args()
+
+    from dictionary import load_trie
+    board = GameBoard.from_string(args.board)
+    plan = Planner(load_trie(), args.turns, args.budget, args.samples).plan(board)
+    if plan.move is None:
+        print("There are no words on this board.")
+        raise SystemExit(1)
+    print(f"Play {plan.move.word} for {plan.move.score}, using {swaps_used(plan.move)} swaps. "
+          f"Expect {plan.expected_score:.1f} over {plan.turns} turns{'' if plan.complete else ' (out of time)'}.")
+    print(draw_solution_on_terminal(board, plan.move.path))
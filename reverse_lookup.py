@@ -0,0 +1,84 @@
+'''Solving with a dictionary filtered down to the board first.
+
+Most of the dictionary can't be spelt on a given board at all: a word needs
+each of its letters on some tile, or a swap to make up for it. ReverseLookup
+keeps the word list as a matrix of letter counts, a row of 26 per word, so
+checking every word against the board's letters is a few array operations.
+The words that pass, usually a few thousand without swaps, go into a small
+trie built for the board, which the usual search then walks.
+
+The filter only counts letters, it doesn't know which tiles are next to each
+other, so every word the full trie would find is still found, with the same
+scores. Filtering and building the trie take longer than a whole search
+without swaps, so the full trie is quicker there. With more swaps, the search
+dwarfs them. `python3 benchmark.py filter` compares the two on random boards.'''
+
+import re
+import numpy as np
+from algorithm import find_best_word
+from trie import construct_trie_dic
+
+# "full" searches the whole dictionary's trie, "filtered" a trie of the words
+# whose letters the board has
+STRATEGIES = ("full", "filtered")
+# Boards with fewer swaps are searched quicker than a board's trie has its
+# bounds annotated for pruning
+PRUNING_SWAPS = 2
+
+ord_a = ord('a')
+# Only these can be spelt on a board
+PLAYABLE_WORD = re.compile("[a-z]+")
+
+class ReverseLookup:
+    '''The word list as letter counts, to build a trie of the words each board
+    could spell'''
+
+    def __init__(self, words: list):
+        # Same lower casing as construct_trie_dic. Words with anything but
+        # a-z, like apostrophes and hyphens, can never be spelt on a board.
+        self.words = [word for word in dict.fromkeys(word.lower() for word in words) if PLAYABLE_WORD.fullmatch(word)]
+        self.lengths = np.fromiter(map(len, self.words), dtype=np.int64, count=len(self.words))
+        letters = np.frombuffer("".join(self.words).encode(), dtype=np.uint8) - ord_a
+        rows = np.repeat(np.arange(len(self.words)), self.lengths)
+        # Words are short enough that int8 counts can't overflow when the
+        # board's counts are taken off them
+        self.counts = np.bincount(rows * 26 + letters, minlength=len(self.words) * 26).reshape(-1, 26).astype(np.int8)
+
+    def board_counts(self, board) -> np.ndarray:
+        '''How many of each letter a-z the board's tiles have. Misread tiles
+        holding anything else count for none.'''
+        chars = "".join(letter.char for letter in board.tiles() if letter.char and PLAYABLE_WORD.fullmatch(letter.char))
+        return np.bincount(np.frombuffer(chars.encode(), dtype=np.uint8) - ord_a, minlength=26).astype(np.int8)
+
+    def filter_words(self, board) -> list:
+        '''The words that the board's letters and swaps could spell, not
+        counting where the letters are'''
+        tiles = self.board_counts(board)
+        # The letters each word needs that the board doesn't have
+        missing = np.maximum(self.counts - tiles, 0).sum(axis=1)
+        # Misread tiles can still be stepped on, or swapped
+        steppable = sum(1 for letter in board.tiles() if letter.char)
+        fits = (missing <= board.num_swaps) & (self.lengths <= steppable)
+        return [self.words[i] for i in np.flatnonzero(fits)]
+
+    def board_trie(self, board) -> dict:
+        return construct_trie_dic(self.filter_words(board))
+
+    def solve(self, board, engine: str = "bitmask", pruning: bool = None) -> list:
+        '''find_best_word on the board's own trie. Without saying, pruning is
+        only for boards with PRUNING_SWAPS or more.'''
+        if pruning is None:
+            pruning = engine != "recursive" and board.num_swaps >= PRUNING_SWAPS
+        return find_best_word(self.board_trie(board), board, engine, pruning)
+
+def solve(trie: dict, board, strategy: str = "full", lookup: ReverseLookup = None,
+          engine: str = "bitmask", pruning: bool = None) -> list:
+    '''find_best_word with either strategy. "filtered" needs the dictionary's
+    ReverseLookup. pruning defaults to what's quickest for the strategy.'''
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}', expected one of {STRATEGIES}")
+    if strategy == "filtered":
+        if lookup is None:
+            raise ValueError("The filtered strategy needs a ReverseLookup of the dictionary")
+        return lookup.solve(board, engine, pruning)
+    return find_best_word(trie, board, engine, engine != "recursive" if pruning is None else pruning)
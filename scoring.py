@@ -0,0 +1,89 @@
+'''Scoring many paths at once, for offline analysis.
+
+The solvers keep a word's score as a running sum while they search, using
+each tile's value and DW flag looked up once per board. The same tables as
+NumPy arrays score a whole batch of paths with a few array operations, given
+the paths as a matrix of tile numbers. Turning Solutions' Letter paths into
+the matrix costs about as much as calling score_letters on them, so it pays
+off when the same paths are scored more than once, like against the boards
+after a move. The scores are exactly score_letters', which
+`python3 scoring.py` checks on random boards, timing each step.'''
+
+import numpy as np
+from algorithm import score_letters
+
+def tile_arrays(board) -> tuple:
+    '''values[t] is what tile t adds to a word's score, before doubling, and
+    double_word[t] whether it doubles the word'''
+    tiles = board.tiles()
+    values = np.zeros(len(tiles), dtype=np.int64)
+    double_word = np.zeros(len(tiles), dtype=bool)
+    for letter in tiles:
+        if not letter.char: continue
+        values[letter.tile_number] = letter.points + letter.has_diamond
+        double_word[letter.tile_number] = letter.does_double_word
+    return values, double_word
+
+def path_matrices(paths: list) -> tuple:
+    '''The tile numbers of each path as the rows of a matrix, padded with -1,
+    and a matrix of which of those tiles were swapped'''
+    lengths = np.fromiter(map(len, paths), dtype=np.int64, count=len(paths))
+    total = int(lengths.sum())
+    # Filled in one go from the paths flattened, each letter going to its row
+    # and its place along the path
+    rows = np.repeat(np.arange(len(paths)), lengths)
+    columns = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    tiles = np.full((len(paths), int(lengths.max(initial=0))), -1, dtype=np.int64)
+    swapped = np.zeros(tiles.shape, dtype=bool)
+    tiles[rows, columns] = np.fromiter((letter.tile_number for path in paths for letter in path), dtype=np.int64, count=total)
+    swapped[rows, columns] = np.fromiter((letter.swapped_letter for path in paths for letter in path), dtype=bool, count=total)
+    return tiles, swapped
+
+def score_paths(values: np.ndarray, double_word: np.ndarray, tiles: np.ndarray, swapped: np.ndarray) -> np.ndarray:
+    '''The score of each row of tiles. A swapped tile scores nothing and
+    doesn't double, as its Letter has no points, diamond or DW.'''
+    used = (tiles >= 0) & ~swapped
+    # Padding indexes tile 0, then gets masked out
+    indices = np.where(tiles >= 0, tiles, 0)
+    points = np.where(used, values[indices], 0).sum(axis=1)
+    doubled = (used & double_word[indices]).any(axis=1)
+    return np.where(doubled, points * 2, points)
+
+def score_solutions(board, solutions: list) -> np.ndarray:
+    '''The score of each solution's path on board'''
+    values, double_word = tile_arrays(board)
+    return score_paths(values, double_word, *path_matrices([solution.path for solution in solutions]))
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import time
+    from algorithm import BitmaskSearch
+    from benchmark import random_board
+    parser = argparse.ArgumentParser(description="Checks score_solutions against score_letters on every word of random boards.")
+    parser.add_argument("--boards", type=int, default=20)
+    parser.add_argument("--swaps", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from dictionary import load_trie
+    trie = load_trie()
+    rng = random.Random(args.seed)
+    checked, loop_seconds, matrix_seconds, batch_seconds = 0, 0, 0, 0
+    for _ in range(args.boards):
+        board = random_board(rng, args.swaps)
+        solutions = BitmaskSearch(trie, board, top_n=None).search()
+        start = time.perf_counter()
+        expected = [score_letters(solution.path) for solution in solutions]
+        loop_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        tiles, swapped = path_matrices([solution.path for solution in solutions])
+        matrix_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        scores = score_paths(*tile_arrays(board), tiles, swapped)
+        batch_seconds += time.perf_counter() - start
+        assert scores.tolist() == expected, "score_paths differs from score_letters"
+        assert [solution.score for solution in solutions] == expected, "the search's running score differs from score_letters"
+        checked += len(solutions)
+    print(f"{checked} paths scored the same. score_letters took {loop_seconds:.3f}s, "
+          f"path_matrices {matrix_seconds:.3f}s and score_paths {batch_seconds:.3f}s")
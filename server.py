@@ -0,0 +1,233 @@
+'''A local HTTP solve service.
+
+Loads the dictionary once and keeps a pool of solver processes, so a solve
+costs only the search. Run `python3 server.py --port 8080`, then:
+    POST /solve         a board as JSON, in any of the formats batch.py reads
+    POST /solve?swaps=1 a screenshot, with an image/* Content-Type. ocr=template
+                        reads it without tesseract.
+    GET  /metrics       request counts and latency histograms, in Prometheus'
+                        text format
+Responses are batch.py's result dicts. Solves past the pool's capacity wait
+in a queue, and once that's full too, requests are turned away with a 503
+and a Retry-After, so a burst slows everyone down a little instead of
+piling up without bound.
+
+Only uses the standard library, and speaks just enough HTTP/1.1 for curl and
+friends: one request per connection.'''
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from multiprocessing import get_all_start_methods, get_context
+from urllib.parse import urlsplit, parse_qs
+import batch
+from game_board import NUM_PROCS, OCR_BACKENDS
+import parallel
+
+# Solves waiting for a free process before requests are turned away
+MAX_QUEUED = 64
+MAX_BODY_BYTES = 20 * 1024 * 1024
+RETRY_AFTER_SECONDS = 1
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+IMAGE_SUFFIXES = {"image/png": ".png", "image/jpeg": ".jpg", "image/jpg": ".jpg"}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 422: "Unprocessable Entity", 503: "Service Unavailable"}
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class Histogram:
+    '''Cumulative histogram of observations, like a Prometheus histogram'''
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound: self.counts[i] += 1
+
+    def lines(self, name: str) -> list:
+        lines = [f'{name}_bucket{{le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        return lines + [f"{name}_sum {self.sum}", f"{name}_count {self.count}"]
+
+class SolveServer:
+    '''Serves solves from a pool of processes sharing the trie. Start the pool
+    before the event loop, as forking a process running threads isn't safe.'''
+
+    def __init__(self, trie: dict, processes: int = NUM_PROCS, max_queued: int = MAX_QUEUED):
+        self.processes = processes
+        self.max_queued = max_queued
+        parallel.TRIE = trie
+        if "fork" in get_all_start_methods():
+            # Workers inherit the trie copy-on-write
+            context, initializer = get_context("fork"), None
+        else:
+            context, initializer = get_context(), batch.init_worker
+        self.pool = context.Pool(processes=processes, initializer=initializer)
+        self.slots = None
+        self.waiting = 0
+        self.solving = 0
+        self.responses = {}
+        self.wait_latency = Histogram()
+        self.solve_latency = Histogram()
+        self.request_latency = Histogram()
+
+    async def solve(self, board: dict) -> dict:
+        '''Runs batch.solve_board on the pool, once a process is free'''
+        if self.slots is None:
+            # Made here so it belongs to the running loop
+            self.slots = asyncio.Semaphore(self.processes)
+        if self.waiting >= self.max_queued and self.slots.locked():
+            raise HttpError(503, "Too many solves queued, try again shortly")
+        queued = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.wait_latency.observe(started - queued)
+        self.solving += 1
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            def resolve(result):
+                loop.call_soon_threadsafe(future.set_result, result)
+            def reject(error):
+                loop.call_soon_threadsafe(future.set_exception, error)
+            self.pool.apply_async(batch.solve_board, ((board, 0, board.get("ocr", "tesseract"), "bitmask", True, "full", False, None),),
+                                  callback=resolve, error_callback=reject)
+            return await future
+        finally:
+            self.solving -= 1
+            self.slots.release()
+            self.solve_latency.observe(time.perf_counter() - started)
+
+    async def solve_image(self, image: bytes, content_type: str, query: dict) -> dict:
+        ocr = query.get("ocr", ["tesseract"])[0]
+        if ocr not in OCR_BACKENDS:
+            raise HttpError(400, f"Unknown OCR backend '{ocr}', expected one of {OCR_BACKENDS}")
+        try:
+            swaps = int(query.get("swaps", ["0"])[0])
+        except ValueError:
+            raise HttpError(400, "swaps must be a number")
+        # GameBoard reads screenshots from a path
+        with tempfile.NamedTemporaryFile(suffix=IMAGE_SUFFIXES.get(content_type, ".png"), delete=False) as f:
+            f.write(image)
+        try:
+            return await self.solve({"id": query.get("id", [None])[0], "image": f.name, "swaps": swaps, "ocr": ocr})
+        finally:
+            os.remove(f.name)
+
+    async def route(self, method: str, target: str, headers: dict, body: bytes) -> tuple:
+        '''Returns the status, content type and body of the response'''
+        url = urlsplit(target)
+        if url.path == "/metrics":
+            if method != "GET": raise HttpError(405, "Use GET")
+            return 200, "text/plain; version=0.0.4", self.metrics()
+        if url.path != "/solve":
+            raise HttpError(404, f"No such path {url.path}")
+        if method != "POST": raise HttpError(405, "Use POST")
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type.startswith("image/") or content_type == "application/octet-stream":
+            result = await self.solve_image(body, content_type, parse_qs(url.query))
+        else:
+            try:
+                board = json.loads(body)
+            except ValueError as e:
+                raise HttpError(400, f"Invalid JSON: {e}")
+            if not isinstance(board, dict) or "image" in board:
+                # Paths on the server's disk aren't for clients to read
+                raise HttpError(400, "Expected a board with letters or a board string")
+            result = await self.solve(board)
+        return 422 if "error" in result else 200, "application/json", json.dumps(result)
+
+    async def handle(self, reader, writer):
+        start = time.perf_counter()
+        try:
+            try:
+                method, target, headers, body = await read_request(reader)
+                status, content_type, payload = await self.route(method, target, headers, body)
+            except HttpError as e:
+                status, content_type = e.status, "application/json"
+                payload = json.dumps({"error": str(e)})
+            extra = f"Retry-After: {RETRY_AFTER_SECONDS}\r\n" if status == 503 else ""
+            payload = payload.encode()
+            writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(payload)}\r\n{extra}Connection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+            self.responses[status] = self.responses.get(status, 0) + 1
+            self.request_latency.observe(time.perf_counter() - start)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def metrics(self) -> str:
+        lines = ["# TYPE spellcast_responses_total counter"]
+        lines += [f'spellcast_responses_total{{status="{status}"}} {count}' for status, count in sorted(self.responses.items())]
+        lines += ["# TYPE spellcast_solves_queued gauge", f"spellcast_solves_queued {self.waiting}",
+                  "# TYPE spellcast_solves_running gauge", f"spellcast_solves_running {self.solving}"]
+        for name, histogram in [("spellcast_queue_wait_seconds", self.wait_latency),
+                                ("spellcast_solve_seconds", self.solve_latency),
+                                ("spellcast_request_seconds", self.request_latency)]:
+            lines += [f"# TYPE {name} histogram"] + histogram.lines(name)
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+async def read_request(reader) -> tuple:
+    '''Reads the method, target, lower-cased headers and body of a request'''
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise HttpError(400, "Malformed request line")
+    method, target, _ = request_line
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "Malformed Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, f"Bodies are limited to {MAX_BODY_BYTES} bytes")
+    return method, target, headers, await reader.readexactly(length)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serves solves over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--processes", type=int, default=NUM_PROCS)
+    parser.add_argument("--max-queued", type=int, default=MAX_QUEUED, help="solves waiting before requests are turned away")
+    args = parser.parse_args()
+
+    from dictionary import load_trie
+    trie = load_trie()
+    server = SolveServer(trie, args.processes, args.max_queued)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,132 @@
+'''Caches for boards we have already seen.
+
+SolveCache keeps find_best_word results keyed on a canonical encoding of the
+board: every tile's letter, points, diamond and double word, plus the swap
+count. The key also covers the engine and pruning, as tied words can come out
+differently, and a fingerprint of the trie being searched, so a different
+dictionary misses instead of serving old words.
+OcrCache keeps what GameBoard read from a screenshot, keyed on a hash of the
+file, so posting the same screenshot again skips OCR.
+
+Both keep the most recently used entries in memory, and can also keep every
+entry on disk so they survive restarts and are shared between processes.'''
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from copy import copy
+from algorithm import find_best_word, TOP_N
+from dictionary import CACHE_DIR
+from trie import fingerprint
+
+MAX_ENTRIES = 1024
+# Part of every key. Bump it when the same board would now be solved or read
+# differently, so entries already on disk miss.
+FORMAT_VERSION = 2
+
+class LRUCache:
+    '''String keyed cache holding the max_entries most recently used entries in
+    memory. With a directory, every entry is also pickled there, and misses in
+    memory are looked up on disk.'''
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, directory: str = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory: os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.pickle')
+
+    def get(self, key: str):
+        '''Returns the cached value, or None'''
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.directory and os.path.exists(self.path(key)):
+            with open(self.path(key), 'rb') as f:
+                stored_key, value = pickle.load(f)
+            # guard against hash collisions
+            if stored_key == key:
+                self.remember(key, value)
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value):
+        self.remember(key, value)
+        if self.directory:
+            path = self.path(key)
+            # Other processes may read the file as it's written, so rename into place
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    def remember(self, key: str, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+def board_key(board) -> str:
+    '''Canonical encoding of everything about a board that affects its solutions'''
+    tiles = []
+    for row in board.grid:
+        for letter in row:
+            tiles.append(f"{letter.char or '*'}{letter.points}{'d' if letter.has_diamond else ''}{'w' if letter.does_double_word else ''}")
+    return ",".join(tiles) + f"/{board.num_swaps}"
+
+def copy_solutions(solutions) -> list:
+    '''The solutions with their own Letters, so a caller changing a path's
+    Letters doesn't change the cached ones'''
+    return [solution._replace(path=tuple(copy(letter) for letter in solution.path)) for solution in solutions]
+
+def dictionary_key(trie) -> str:
+    '''Identifies the words in a dict trie or Dawg'''
+    if hasattr(trie, "fingerprint"): return trie.fingerprint()
+    return fingerprint(trie)
+
+class SolveCache(LRUCache):
+    '''find_best_word results for boards solved before with the same trie'''
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, directory: str = None):
+        super().__init__(max_entries, directory)
+        # The last trie solved with and its dictionary_key, as fingerprinting
+        # a dict trie walks all of it
+        self.trie = None
+        self.dictionary_key = None
+
+    def key(self, trie, board, engine: str = "recursive", pruning: bool = False) -> str:
+        if trie is not self.trie:
+            self.trie, self.dictionary_key = trie, dictionary_key(trie)
+        return f"v{FORMAT_VERSION}/{self.dictionary_key}/{engine}/{int(pruning)}/{TOP_N}/{board_key(board)}"
+
+    def solve(self, trie, board, engine: str = "recursive", pruning: bool = False) -> list:
+        '''find_best_word, or its answer from last time for the same board,
+        trie, engine and pruning'''
+        key = self.key(trie, board, engine, pruning)
+        solutions = self.get(key)
+        if solutions is None:
+            solutions = find_best_word(trie, board, engine, pruning)
+            self.put(key, copy_solutions(solutions))
+            return list(solutions)
+        return copy_solutions(solutions)
+
+class OcrCache(LRUCache):
+    '''What GameBoard read from screenshots, keyed on the file contents'''
+
+    def key(self, image_bytes: bytes, ocr: str) -> str:
+        return f"v{FORMAT_VERSION}/{ocr}/{hashlib.sha256(image_bytes).hexdigest()}"
+
+def default_solve_cache(max_entries: int = MAX_ENTRIES) -> SolveCache:
+    '''A solve cache backed by the dictionary cache directory'''
+    return SolveCache(max_entries=max_entries, directory=os.path.join(CACHE_DIR, 'solves'))
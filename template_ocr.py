@@ -0,0 +1,257 @@
+'''In-process OCR that matches tiles against the templates in bitmasks/.
+
+Each letter is cut to its ink, padded square and scaled to GLYPH_SIZE, then
+all 25 tiles are correlated against every letter template in one matrix
+product. Multiplier badges are found by matching the DL, TL and DW templates
+against the top left corner of each tile, scaled so the tile is TILE_SIZE
+wide, which makes both work on screenshots of any size.
+
+Templates are plain images named after what they show: A.png to Z.png are dark
+letters on a light background, DL.png, TL.png and DW.png are badges at the
+TILE_SIZE scale. Anything after an underscore is ignored, so O_2.png is another
+O. To add templates from a screenshot whose letters you know, run
+`python3 template_ocr.py learn sample_data/game.png ATCNOKZOAIAIYDPEIXSSRNGLR --badge 0,4=DL`.
+`python3 template_ocr.py render BHJ` draws stand-in templates for letters no
+screenshot has shown yet, with OpenCV's own font. They are saved as B_rendered.png
+and so on, a match against one is never more than RENDERED_CONFIDENCE, and
+learn deletes them once it saves a real template for the letter. B, H, J, M,
+V and W are still stand-ins.'''
+
+import glob
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+
+BITMASK_DIR = 'bitmasks'
+GLYPH_SIZE = 24
+TILE_SIZE = 56
+# How far around a tile's top left corner a badge can be, as a fraction of the tile
+BADGE_REACH = 0.4
+MIN_LETTER_CONFIDENCE = 0.5
+MIN_BADGE_CONFIDENCE = 0.7
+# learn skips letters the templates already read with this much confidence
+LEARNED_CONFIDENCE = 0.8
+# White space left around letters when saving them as templates
+TEMPLATE_MARGIN = 4
+# Templates drawn by render end with this. They don't look like the game's
+# font, so reads matched against them are capped at RENDERED_CONFIDENCE, which
+# is still read as the letter but never skipped by learn.
+RENDERED_SUFFIX = "_rendered"
+RENDERED_CONFIDENCE = 0.6
+# Badge name to (letter multiplier, does double word)
+BADGES = {"DL": (2, False), "TL": (3, False), "DW": (1, True)}
+
+TileReading = namedtuple("TileReading", "char multiplier does_double_word confidence")
+
+def letter_ink(grey_image):
+    '''Thresholds a greyscale crop of a letter and cuts it down to the letter,
+    white on black. Returns None if there is no ink.'''
+    _, ink = cv2.threshold(grey_image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Capital letters are one blob. Bits of the diamond or tile edge that made
+    # it into the crop are separate, smaller blobs, so only keep the biggest.
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(ink)
+    if count < 2: return None
+    biggest = 1 + stats[1:, cv2.CC_STAT_AREA].argmax()
+    x, y, w, h = stats[biggest, :4]
+    # Letters sit in the middle of the crop. Something as wide or as tall as
+    # the whole crop, like the placeholder for a letter still being dealt, isn't one.
+    if w == ink.shape[1] or h == ink.shape[0]: return None
+    return np.where(labels[y:y+h, x:x+w] == biggest, 255, 0).astype(np.uint8)
+
+def glyph_vector(grey_image):
+    '''Cuts the letter in a greyscale crop down to its ink, pads it square and
+    scales it to GLYPH_SIZE. Returns it flattened, zero mean and unit length,
+    so dot products between glyphs are correlations. None if there is no ink.'''
+    ink = letter_ink(grey_image)
+    if ink is None: return None
+    h, w = ink.shape
+    side = max(h, w)
+    top, left = (side - h) // 2, (side - w) // 2
+    ink = cv2.copyMakeBorder(ink, top, side - h - top, left, side - w - left, cv2.BORDER_CONSTANT, value=0)
+    vector = cv2.resize(ink, (GLYPH_SIZE, GLYPH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+def badge_region(padded_grey, bound, pad: int):
+    '''The top left corner of a tile from an image padded by pad pixels on each
+    side, scaled so the tile is TILE_SIZE wide'''
+    reach_y = int((bound.hi_y - bound.lo_y) * BADGE_REACH)
+    reach_x = int((bound.hi_x - bound.lo_x) * BADGE_REACH)
+    region = padded_grey[pad + bound.lo_y - reach_y:pad + bound.lo_y + reach_y, pad + bound.lo_x - reach_x:pad + bound.lo_x + reach_x]
+    scale = TILE_SIZE / (bound.hi_x - bound.lo_x)
+    return cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+class TemplateReader:
+    '''Holds the templates, loaded once, and reads whole boards with them'''
+
+    def __init__(self, bitmask_dir: str = BITMASK_DIR):
+        self.letters = []
+        rendered = []
+        vectors = []
+        self.badges = {}
+        for file_name in sorted(os.listdir(bitmask_dir)):
+            name, extension = os.path.splitext(file_name)
+            if extension != ".png": continue
+            is_rendered = RENDERED_SUFFIX in name
+            name = name.split("_")[0]
+            grey = cv2.imread(os.path.join(bitmask_dir, file_name), cv2.IMREAD_GRAYSCALE)
+            if name in BADGES:
+                self.badges[name] = grey
+            elif len(name) == 1:
+                vector = glyph_vector(grey)
+                if vector is None: continue
+                self.letters.append(name.lower())
+                rendered.append(is_rendered)
+                vectors.append(vector)
+        self.rendered = np.array(rendered, dtype=bool)
+        self.templates = np.stack(vectors) if vectors else np.zeros((0, GLYPH_SIZE*GLYPH_SIZE), np.float32)
+
+    def read_letters(self, grey, letter_bounds: list) -> list:
+        '''Returns (char, confidence) for each letter bound, matching all of them
+        against all letter templates at once. char is None below
+        MIN_LETTER_CONFIDENCE, and confidence at most RENDERED_CONFIDENCE when
+        the best match was a rendered stand-in.'''
+        glyphs = np.zeros((len(letter_bounds), GLYPH_SIZE*GLYPH_SIZE), np.float32)
+        for n, bound in enumerate(letter_bounds):
+            vector = glyph_vector(grey[bound.lo_y:bound.hi_y, bound.lo_x:bound.hi_x])
+            if vector is not None: glyphs[n] = vector
+        if len(self.letters) == 0:
+            return [(None, 0.0)] * len(letter_bounds)
+        correlations = glyphs @ self.templates.T
+        best = correlations.argmax(axis=1)
+        confidences = correlations[np.arange(len(letter_bounds)), best]
+        confidences = np.where(self.rendered[best], np.minimum(confidences, RENDERED_CONFIDENCE), confidences)
+        return [(self.letters[i] if confidence >= MIN_LETTER_CONFIDENCE else None, float(confidence))
+                for i, confidence in zip(best.tolist(), confidences.tolist())]
+
+    def read_badge(self, padded_grey, bound, pad: int):
+        '''Returns the name of the badge on the tile's corner, or None'''
+        region = badge_region(padded_grey, bound, pad)
+        best, best_score = None, MIN_BADGE_CONFIDENCE
+        for name, template in self.badges.items():
+            if template.shape[0] > region.shape[0] or template.shape[1] > region.shape[1]: continue
+            score = cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED).max()
+            if score > best_score:
+                best, best_score = name, score
+        return best
+
+    def read_tiles(self, image, tile_bounds: list, letter_bounds: list) -> list:
+        '''Returns a TileReading for each tile of a BGR screenshot'''
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        letters = self.read_letters(grey, letter_bounds)
+        # Badges hang off the edge of tiles at the edge of the board
+        pad = max(bound.hi_x - bound.lo_x for bound in tile_bounds)
+        padded = cv2.copyMakeBorder(grey, pad, pad, pad, pad, cv2.BORDER_REPLICATE)
+        readings = []
+        for (char, confidence), bound in zip(letters, tile_bounds):
+            multiplier, does_double_word = BADGES.get(self.read_badge(padded, bound, pad), (1, False))
+            readings.append(TileReading(char, multiplier, does_double_word, confidence))
+        return readings
+
+READER = None
+
+def get_reader() -> TemplateReader:
+    '''The templates are only loaded once per process'''
+    global READER
+    if READER is None:
+        READER = TemplateReader()
+    return READER
+
+def save_letter_template(bitmask_dir: str, char: str, ink, overwrite: bool = False, rendered: bool = False):
+    '''Saves a letter cut out by letter_ink as a dark letter on white, with a
+    margin so letter_ink finds it again'''
+    ink = cv2.copyMakeBorder(ink, TEMPLATE_MARGIN, TEMPLATE_MARGIN, TEMPLATE_MARGIN, TEMPLATE_MARGIN, cv2.BORDER_CONSTANT, value=0)
+    return save_template(bitmask_dir, char.upper() + (RENDERED_SUFFIX if rendered else ""), 255 - ink, overwrite)
+
+def save_template(bitmask_dir: str, name: str, template, overwrite: bool = False):
+    '''Saves a template as name.png, or as a new variant like name_2.png if
+    there already is one. Returns the path.'''
+    path = os.path.join(bitmask_dir, f"{name}.png")
+    variant = 1
+    while os.path.exists(path) and not overwrite:
+        variant += 1
+        path = os.path.join(bitmask_dir, f"{name}_{variant}.png")
+    cv2.imwrite(path, template)
+    return path
+
+def learn(image_path: str, letters: str, badges: dict = None, bitmask_dir: str = BITMASK_DIR, overwrite: bool = False):
+    '''Saves templates from a screenshot. letters are the 25 letters on the
+    board, left to right, top to bottom, with "." for any to skip. badges maps
+    (x, y) tile positions to badge names. Letters the current templates
+    already read confidently are skipped, the rest are added as variants, or
+    replace the existing templates with overwrite. Rendered stand-ins for the
+    letters saved are deleted.'''
+    from game_board import GameBoard, BOARD_SIDE_LEN
+    image = cv2.imread(image_path)
+    board = GameBoard.__new__(GameBoard)
+    tile_bounds = board.find_tile_bounds(image)
+    letter_bounds = board.find_letter_bounds(tile_bounds)
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    reader = TemplateReader(bitmask_dir)
+    readings = reader.read_letters(grey, letter_bounds)
+    saved, learned = [], set()
+    for char, bound, (read_char, confidence) in zip(letters.lower(), letter_bounds, readings):
+        if char == "." or char in learned: continue
+        if not overwrite and read_char == char and confidence >= LEARNED_CONFIDENCE: continue
+        ink = letter_ink(grey[bound.lo_y:bound.hi_y, bound.lo_x:bound.hi_x])
+        if ink is None: continue
+        saved.append(save_letter_template(bitmask_dir, char, ink, overwrite))
+        learned.add(char)
+        for path in glob.glob(os.path.join(bitmask_dir, f"{char.upper()}{RENDERED_SUFFIX}*.png")):
+            os.remove(path)
+    pad = max(bound.hi_x - bound.lo_x for bound in tile_bounds)
+    padded = cv2.copyMakeBorder(grey, pad, pad, pad, pad, cv2.BORDER_REPLICATE)
+    for (x, y), name in (badges or {}).items():
+        region = badge_region(padded, tile_bounds[x + y*BOARD_SIDE_LEN], pad)
+        # The badge sits just up and left of the tile's corner, which is the
+        # middle of the region
+        h, w = region.shape
+        saved.append(save_template(bitmask_dir, name, region[h//8:5*h//8, w//8:5*w//8], overwrite))
+    return saved
+
+def render(letters: str, bitmask_dir: str = BITMASK_DIR):
+    '''Draws stand-in templates for letters with OpenCV's Hershey font. They
+    don't look like the game's font, so learn real ones when a screenshot has
+    them.'''
+    saved = []
+    for char in letters.upper():
+        canvas = np.zeros((96, 96), np.uint8)
+        cv2.putText(canvas, char, (12, 80), cv2.FONT_HERSHEY_DUPLEX, 2.6, 255, 9, cv2.LINE_AA)
+        ys, xs = np.nonzero(canvas > 127)
+        ink = np.where(canvas[ys.min():ys.max()+1, xs.min():xs.max()+1] > 127, 255, 0).astype(np.uint8)
+        saved.append(save_letter_template(bitmask_dir, char, ink, rendered=True))
+    return saved
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Reads boards with templates, or learns templates from a screenshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    read_parser = subparsers.add_parser("read", help="read the letters on a screenshot")
+    read_parser.add_argument("image")
+    learn_parser = subparsers.add_parser("learn", help="save templates from a screenshot whose letters you know")
+    learn_parser.add_argument("image")
+    learn_parser.add_argument("letters", help='the 25 letters left to right, top to bottom, "." to skip one')
+    learn_parser.add_argument("--badge", action="append", default=[], help='a badge as x,y=NAME, e.g. 0,4=DL')
+    learn_parser.add_argument("--overwrite", action="store_true")
+    render_parser = subparsers.add_parser("render", help="draw stand-in templates for letters with no real ones")
+    render_parser.add_argument("letters")
+    args = parser.parse_args()
+
+    if args.command == "learn":
+        badges = {}
+        for badge in args.badge:
+            position, name = badge.split("=")
+            badges[tuple(int(v) for v in position.split(","))] = name.upper()
+        for path in learn(args.image, args.letters, badges, overwrite=args.overwrite):
+            print(f"Saved '{path}'")
+    elif args.command == "render":
+        for path in render(args.letters):
+            print(f"Saved '{path}'")
+    else:
+        from game_board import GameBoard
+        board = GameBoard(args.image, num_swaps=0, ocr="template")
+        print(board)
+        for row in board.grid:
+            print(" ".join(f"{confidence:.2f}" for confidence in board.confidences[row[0].tile_number:row[-1].tile_number+1]))
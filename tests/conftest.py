@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The dictionary and bitmask paths are relative to the repository
+os.chdir(ROOT)
+
+@pytest.fixture(scope="session")
+def trie():
+    from dictionary import load_dictionary
+    from trie import construct_trie_dic
+    return construct_trie_dic(load_dictionary())
+
+@pytest.fixture(scope="session")
+def dawg():
+    from dictionary import load_trie
+    return load_trie()
@@ -0,0 +1,54 @@
+import asyncio
+import random
+import pytest
+from algorithm import find_best_word
+from anytime import AnytimeWorker, improvements_async, solve_anytime, solve_async
+from benchmark import random_board
+
+@pytest.fixture(scope="module")
+def worker(trie):
+    # Started before any event loop, like a server would
+    with AnytimeWorker(trie) as worker:
+        yield worker
+
+def test_finished_search_matches_find_best_word(trie):
+    board = random_board(random.Random(3), 1)
+    progress = solve_anytime(trie, board, None)
+    assert progress.finished
+    assert [s.score for s in progress.solutions] == [s.score for s in find_best_word(trie, board, "bitmask", True)]
+
+def test_async_search_matches(trie, worker):
+    board = random_board(random.Random(4), 0)
+    progress = asyncio.run(solve_async(worker, board, 10))
+    assert progress.finished
+    assert [s.score for s in progress.solutions] == [s.score for s in find_best_word(trie, board, "bitmask", True)]
+
+def test_cancelling_stops_the_search(trie, worker):
+    board = random_board(random.Random(5), 3)
+    async def cancel_after_first():
+        async def consume():
+            async for _ in improvements_async(worker, board, None):
+                pass
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert task.cancelled()
+        # Three swaps take far longer than this to search, the stop event
+        # ended it, and the worker is free for the next board
+        return await asyncio.wait_for(solve_async(worker, random_board(random.Random(4), 0), 10), 5)
+    progress = asyncio.run(cancel_after_first())
+    assert progress.finished
+    assert [s.score for s in progress.solutions] == [s.score for s in find_best_word(trie, random_board(random.Random(4), 0), "bitmask", True)]
+
+def test_closing_the_generator_stops_the_search(worker):
+    async def first_then_close():
+        improvements = improvements_async(worker, random_board(random.Random(6), 3), None)
+        first = await improvements.__anext__()
+        await asyncio.wait_for(improvements.aclose(), 5)
+        return first
+    assert asyncio.run(first_then_close()).finished is None
+    assert asyncio.run(solve_async(worker, random_board(random.Random(4), 0), 10)).finished
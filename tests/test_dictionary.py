@@ -0,0 +1,68 @@
+import gzip
+import dictionary
+from dictionary import (WORD_FILE_HEADER, WORD_FILE_MAGIC, build_dictionary, iter_dictionary, read_word_file,
+                        read_word_file_entries, read_words, stream_trie, write_word_file)
+from trie import construct_trie_dic
+
+WORDS = ["cat", "car", "Card", "cards", "care", "careful", "don't", "a", "car", "zoo"]
+
+def test_word_file_round_trip(tmp_path):
+    path = str(tmp_path / "test.words")
+    assert write_word_file(WORDS, path) == 8
+    words = ["a", "car", "card", "cards", "care", "careful", "cat", "zoo"]
+    assert list(read_word_file(path)) == words
+    assert list(read_words(path)) == words
+    # Each word only stores the letters after those it shares with the one before
+    assert list(read_word_file_entries(path)) == [(0, "a"), (0, "car"), (3, "d"), (4, "s"), (3, "e"), (4, "ful"), (2, "t"), (0, "zoo")]
+
+def test_stream_trie_matches_construct_trie_dic(tmp_path):
+    words_path = str(tmp_path / "test.words")
+    write_word_file(WORDS, words_path)
+    text_path = str(tmp_path / "test.txt")
+    with open(text_path, "w") as f:
+        f.write("\n".join(WORDS))
+    expected = construct_trie_dic(["a", "car", "card", "cards", "care", "careful", "cat", "zoo"])
+    assert stream_trie([words_path], set()) == expected
+    assert stream_trie([text_path], set()) == expected
+    assert stream_trie([words_path, text_path], set()) == expected
+
+def test_stream_trie_skips_banned_words_in_a_prefix_run(tmp_path):
+    # Leaving out card means the nodes kept for it stop short of the prefix
+    # cards shares with it
+    path = str(tmp_path / "test.words")
+    write_word_file(WORDS, path)
+    banned = {"car", "card", "care"}
+    words = [word for word in read_word_file(path) if word not in banned]
+    assert stream_trie([path], banned) == construct_trie_dic(words)
+
+def test_stream_trie_lower_cases_word_files(tmp_path):
+    # Word files not from write_word_file may hold upper case
+    path = str(tmp_path / "upper.words")
+    entries = [(0, "Ab"), (2, "c"), (0, "ab"), (1, "x"), (0, "b")]
+    with open(path, "wb") as f:
+        f.write(WORD_FILE_HEADER.pack(WORD_FILE_MAGIC, len(entries)))
+        for shared, suffix in entries:
+            f.write(bytes([shared, len(suffix)]) + suffix.encode())
+    assert list(read_word_file(path)) == ["Ab", "Abc", "ab", "ax", "b"]
+    assert stream_trie([path], set()) == construct_trie_dic(["ab", "abc", "ax", "b"])
+
+def test_extra_and_banned_wordlists(tmp_path, monkeypatch):
+    extra = str(tmp_path / "extra.gz")
+    with gzip.open(extra, "wt") as f:
+        # Unsorted, and with a word the bundled lists have
+        f.write("zzyzx\nqwghlm\ncat\n")
+    banned = str(tmp_path / "banned.txt")
+    with open(banned, "w") as f:
+        f.write("dog\nqwghlm\n")
+    monkeypatch.setattr(dictionary, "DICTIONARY_LEVEL", 10)
+    before = build_dictionary()
+    assert "dog" in before and "cat" in before
+    monkeypatch.setattr(dictionary, "EXTRA_WORDLISTS", [extra])
+    monkeypatch.setattr(dictionary, "BANNED_WORDLISTS", [banned])
+    words = list(iter_dictionary())
+    assert words == sorted(set(words))
+    assert set(words) == (set(before) | {"zzyzx"}) - {"dog"}
+    assert stream_trie() == construct_trie_dic(words)
+
+def test_stream_trie_matches_the_dictionary():
+    assert stream_trie() == construct_trie_dic(build_dictionary())
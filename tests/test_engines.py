@@ -0,0 +1,53 @@
+import random
+import pytest
+from algorithm import ENGINES, BitmaskSearch, SwapSearch, TopN, find_best_word
+from benchmark import random_board
+
+SEED = 7
+BOARDS_PER_SWAP_COUNT = 4
+
+def boards(num_swaps: int) -> list:
+    rng = random.Random(SEED + num_swaps)
+    return [random_board(rng, num_swaps) for _ in range(BOARDS_PER_SWAP_COUNT)]
+
+def scores(solutions: list) -> list:
+    return [solution.score for solution in solutions]
+
+def swaps_own_letter(board, solution) -> bool:
+    return any(letter.swapped_letter and letter.char == board.grid[letter.position[1]][letter.position[0]].char
+               for letter in solution.path)
+
+def expected_scores(trie, board, engine: str) -> list:
+    '''The recursive search's top scores. The swap engine leaves out paths
+    swapping a tile to its own letter, so for it they're left out of every
+    word found instead.'''
+    if engine != "swap":
+        return scores(find_best_word(trie, board, "recursive"))
+    best = TopN()
+    for solution in BitmaskSearch(trie, board, top_n=None).search():
+        if not swaps_own_letter(board, solution): best.push(solution)
+    return scores(best.solutions())
+
+@pytest.mark.parametrize("num_swaps", [0, 1])
+@pytest.mark.parametrize("engine", [engine for engine in ENGINES if engine != "recursive"])
+@pytest.mark.parametrize("pruning", [False, True])
+def test_engines_match_recursive(trie, engine, pruning, num_swaps):
+    for board in boards(num_swaps):
+        assert scores(find_best_word(trie, board, engine, pruning)) == expected_scores(trie, board, engine)
+
+@pytest.mark.parametrize("num_swaps", [0, 1])
+@pytest.mark.parametrize("engine", ENGINES)
+def test_dawg_matches_dict_trie(trie, dawg, engine, num_swaps):
+    for board in boards(num_swaps):
+        assert scores(find_best_word(dawg, board, engine, engine != "recursive")) == expected_scores(trie, board, engine)
+
+def test_swap_engine_skips_swaps_to_the_own_letter(trie):
+    board = boards(1)[0]
+    solutions = SwapSearch(trie, board, top_n=None).search()
+    assert not any(swaps_own_letter(board, solution) for solution in solutions)
+    every_path = BitmaskSearch(trie, board, top_n=None).search()
+    assert len(solutions) == sum(not swaps_own_letter(board, solution) for solution in every_path)
+
+def test_unknown_engine(trie):
+    with pytest.raises(ValueError):
+        find_best_word(trie, boards(0)[0], "breadth-first")
@@ -0,0 +1,34 @@
+import pytest
+from game_board import EXAMPLE_BOARD, GameBoard
+from letter import Letter
+
+def test_from_string_example():
+    board = GameBoard.from_string(EXAMPLE_BOARD)
+    letters, diamonds = EXAMPLE_BOARD.split()[:2]
+    assert board.num_swaps == 2
+    assert "".join(letter.char for letter in board.tiles()) == letters
+    assert [letter.position for letter in board.tiles() if letter.does_double_word] == [(4, 0)]
+    triple = board.grid[4][3]
+    assert triple.points == Letter.char_to_points[triple.char] * 3
+    assert [letter.has_diamond for letter in board.tiles()] == [char == "y" for char in diamonds]
+    # No DL tile, so every other tile scores its letter's points
+    assert all(letter.points == Letter.char_to_points[letter.char] for letter in board.tiles() if letter is not triple)
+
+def test_from_string_slashes_and_default_swaps():
+    board = GameBoard.from_string("uuifioplgzreiilotdioaqyio/ / / 3 4", num_swaps=1)
+    assert board.num_swaps == 1
+    assert not any(letter.has_diamond or letter.does_double_word for letter in board.tiles())
+    assert board.grid[4][3].points == 3
+
+def test_from_dict_matches_from_string():
+    board = GameBoard.from_dict({"letters": "uuifioplgzreiilotdioaqyio", "swaps": 2, "dw": [4, 0], "tl": [3, 4],
+                                 "diamonds": [[0, 0], [1, 0], [2, 0]]})
+    example = GameBoard.from_string(EXAMPLE_BOARD)
+    assert [letter.points for letter in board.tiles()] == [letter.points for letter in example.tiles()]
+    assert board.grid[0][4].does_double_word
+    assert [letter.position for letter in board.tiles() if letter.has_diamond] == [(0, 0), (1, 0), (2, 0)]
+
+@pytest.mark.parametrize("text", ["uuifioplgzreiilotdioaqyi", "uuifioplgzreiilotdioaqyio/yyn", "uuifioplgzreiilotdioaqyio//5 0"])
+def test_from_string_rejects_bad_boards(text):
+    with pytest.raises(ValueError):
+        GameBoard.from_string(text)
@@ -0,0 +1,16 @@
+from letter import BOARD_SIDE_LEN, NEIGHBOURS, neighbour_table
+
+def test_neighbour_table():
+    assert NEIGHBOURS == neighbour_table()
+    assert len(NEIGHBOURS) == BOARD_SIDE_LEN * BOARD_SIDE_LEN
+    # Row and column 0 have neighbours too
+    assert NEIGHBOURS[0] == (1, 5, 6)
+    last = BOARD_SIDE_LEN - 1
+    for tile, neighbours in enumerate(NEIGHBOURS):
+        row, col = divmod(tile, BOARD_SIDE_LEN)
+        edges = (row in (0, last)) + (col in (0, last))
+        assert len(neighbours) == (3 if edges == 2 else 5 if edges == 1 else 8)
+        assert tile not in neighbours
+        assert all(max(abs(row - n // BOARD_SIDE_LEN), abs(col - n % BOARD_SIDE_LEN)) == 1 for n in neighbours)
+        # Stepping is symmetric
+        assert all(tile in NEIGHBOURS[n] for n in neighbours)
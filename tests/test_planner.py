@@ -0,0 +1,21 @@
+import random
+import time
+import pytest
+from benchmark import random_board
+from planner import Planner
+
+@pytest.mark.parametrize("num_swaps", [2, 3])
+def test_plan_returns_within_budget(dawg, num_swaps):
+    board = random_board(random.Random(num_swaps), num_swaps)
+    start = time.perf_counter()
+    plan = Planner(dawg, budget=0.5).plan(board)
+    assert time.perf_counter() - start < 0.5 + 0.1
+    # Too little time for every swap's search, but there's still a move
+    assert plan.move is not None and not plan.complete
+    assert plan.expected_score == plan.move.score
+
+def test_plan_without_swaps_looks_ahead(dawg):
+    board = random_board(random.Random(1), 0)
+    plan = Planner(dawg, turns=2, samples=1, budget=30).plan(board)
+    assert plan.complete and plan.turns == 2
+    assert plan.expected_score > plan.move.score
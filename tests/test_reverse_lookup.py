@@ -0,0 +1,29 @@
+import random
+import pytest
+from benchmark import random_board
+from dictionary import load_dictionary
+from game_board import GameBoard
+from reverse_lookup import ReverseLookup, solve
+
+def test_words_outside_a_to_z_are_left_out():
+    lookup = ReverseLookup(["don't", "Cat", "a-b", "café", "act"])
+    assert lookup.words == ["cat", "act"]
+    assert lookup.counts.shape == (2, 26)
+
+def test_misread_tiles_count_for_no_letter():
+    lookup = ReverseLookup(["cat", "act", "tack"])
+    board = GameBoard.from_letters("cat" + "?" * 22, 0)
+    assert sorted(lookup.filter_words(board)) == ["act", "cat"]
+    board.num_swaps = 1
+    # A misread tile can still be swapped for the k
+    assert "tack" in lookup.filter_words(board)
+
+@pytest.mark.parametrize("num_swaps", [0, 1])
+def test_filtered_matches_full(trie, num_swaps):
+    lookup = ReverseLookup(load_dictionary())
+    rng = random.Random(13 + num_swaps)
+    for _ in range(3):
+        board = random_board(rng, num_swaps)
+        full = solve(trie, board, "full")
+        filtered = solve(trie, board, "filtered", lookup)
+        assert [s.score for s in filtered] == [s.score for s in full]
@@ -0,0 +1,33 @@
+import random
+import numpy as np
+import pytest
+from algorithm import BitmaskSearch, score_letters
+from benchmark import random_board
+from scoring import path_matrices, score_paths, score_solutions, tile_arrays
+
+@pytest.mark.parametrize("num_swaps", [0, 1])
+def test_score_paths_matches_score_letters(trie, num_swaps):
+    rng = random.Random(11 + num_swaps)
+    for _ in range(3):
+        board = random_board(rng, num_swaps)
+        solutions = BitmaskSearch(trie, board, top_n=None).search()
+        expected = [score_letters(solution.path) for solution in solutions]
+        assert score_paths(*tile_arrays(board), *path_matrices([s.path for s in solutions])).tolist() == expected
+        assert score_solutions(board, solutions).tolist() == expected
+        # The search's running score too
+        assert [solution.score for solution in solutions] == expected
+
+def test_padding_and_swaps():
+    board = random_board(random.Random(5), 0)
+    values, double_word = tile_arrays(board)
+    tiles = np.array([[0, 1, -1], [2, -1, -1]])
+    swapped = np.array([[False, True, False], [False, False, False]])
+    tiles_list = board.tiles()
+    first = values[0] * (2 if double_word[0] else 1)
+    second = values[2] * (2 if double_word[2] else 1)
+    assert score_paths(values, double_word, tiles, swapped).tolist() == [first, second]
+    assert [score_letters([tiles_list[0]]), score_letters([tiles_list[2]])] == [first, second]
+
+def test_no_paths():
+    board = random_board(random.Random(5), 0)
+    assert score_solutions(board, []).tolist() == []
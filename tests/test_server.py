@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pytest
+from server import SolveServer, RETRY_AFTER_SECONDS
+
+BOARD = {"letters": "uuifioplgzreiilotdioaqyio", "swaps": 0, "dw": [4, 0]}
+
+@pytest.fixture(scope="module")
+def solve_server(trie):
+    server = SolveServer(trie, processes=1, max_queued=1)
+    yield server
+    server.close()
+
+async def request(port: int, method: str, target: str, body: bytes = b"", content_type: str = "application/json") -> tuple:
+    '''Returns the status, lower-cased headers and body of the response'''
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in header_lines)}
+    return int(status_line.split()[1]), headers, payload
+
+def run_with_server(solve_server, test):
+    '''Runs test(port) against solve_server on a free port'''
+    async def main():
+        server = await asyncio.start_server(solve_server.handle, "127.0.0.1", 0)
+        async with server:
+            return await test(server.sockets[0].getsockname()[1])
+    return asyncio.run(main())
+
+def test_solve(solve_server):
+    async def test(port):
+        return await request(port, "POST", "/solve", json.dumps(BOARD).encode())
+    status, headers, body = run_with_server(solve_server, test)
+    assert status == 200 and headers["content-type"] == "application/json"
+    result = json.loads(body)
+    assert len(result["solutions"]) == 5
+    scores = [solution["score"] for solution in result["solutions"]]
+    assert scores == sorted(scores, reverse=True)
+
+@pytest.mark.parametrize("method, target, body, expected", [
+    ("POST", "/solve", b"{not json", 400),
+    ("POST", "/solve", json.dumps({"image": "/etc/passwd"}).encode(), 400),
+    ("POST", "/solve", json.dumps({"letters": "abc"}).encode(), 422),
+    ("GET", "/solve", b"", 405),
+    ("POST", "/metrics", b"", 405),
+    ("GET", "/nowhere", b"", 404),
+])
+def test_errors(solve_server, method, target, body, expected):
+    async def test(port):
+        return await request(port, method, target, body)
+    status, _, body = run_with_server(solve_server, test)
+    assert status == expected
+    assert "error" in json.loads(body)
+
+def test_backpressure(solve_server):
+    async def test(port):
+        # Take the one process, so the next solve queues and fills the queue
+        solve_server.slots = asyncio.Semaphore(1)
+        await solve_server.slots.acquire()
+        queued = asyncio.create_task(request(port, "POST", "/solve", json.dumps(BOARD).encode()))
+        while solve_server.waiting == 0:
+            await asyncio.sleep(0.01)
+        turned_away = await request(port, "POST", "/solve", json.dumps(BOARD).encode())
+        solve_server.slots.release()
+        return turned_away, await queued
+    (status, headers, _), (queued_status, _, _) = run_with_server(solve_server, test)
+    assert status == 503
+    assert headers["retry-after"] == str(RETRY_AFTER_SECONDS)
+    assert queued_status == 200
+    solve_server.slots = None
+
+def test_metrics(solve_server):
+    async def test(port):
+        await request(port, "POST", "/solve", json.dumps(BOARD).encode())
+        return await request(port, "GET", "/metrics")
+    status, headers, body = run_with_server(solve_server, test)
+    assert status == 200 and headers["content-type"].startswith("text/plain")
+    lines = body.decode().splitlines()
+    assert 'spellcast_responses_total{status="200"}' in " ".join(lines)
+    assert "spellcast_solves_queued 0" in lines
+    counts = {line.split()[0]: float(line.split()[1]) for line in lines if not line.startswith("#")}
+    assert counts["spellcast_solve_seconds_count"] >= 1
+    assert counts['spellcast_solve_seconds_bucket{le="+Inf"}'] == counts["spellcast_solve_seconds_count"]
@@ -0,0 +1,46 @@
+from game_board import GameBoard
+from solve_cache import OcrCache, SolveCache
+from trie import construct_trie_dic
+
+LETTERS = "uuifioplgzreiilotdioaqyio"
+
+def test_key_covers_engine_pruning_and_trie():
+    board = GameBoard.from_letters(LETTERS, 1)
+    trie = construct_trie_dic(["lot", "toil"])
+    cache = SolveCache()
+    keys = {cache.key(trie, board, "recursive", False), cache.key(trie, board, "bitmask", False),
+            cache.key(trie, board, "bitmask", True), cache.key(construct_trie_dic(["lot"]), board, "bitmask", True)}
+    assert len(keys) == 4
+    # The same words make the same key, however the trie was built
+    assert cache.key(construct_trie_dic(["toil", "lot"]), board) == cache.key(trie, board)
+
+def test_solve_hits_for_the_same_trie_and_engine(trie):
+    board = GameBoard.from_letters(LETTERS, 0)
+    cache = SolveCache()
+    first = cache.solve(trie, board, "bitmask")
+    assert cache.solve(trie, board, "bitmask") == first
+    cache.solve(trie, board, "swap")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_solutions_dont_share_letters_with_the_cache(trie):
+    cache = SolveCache()
+    # From a miss, then from a hit. Paths from find_best_word hold the board's
+    # own Letters, so each solve gets a new board.
+    for _ in range(2):
+        solutions = cache.solve(trie, GameBoard.from_letters(LETTERS, 0), "bitmask")
+        chars = [[letter.char for letter in solution.path] for solution in solutions]
+        for solution in solutions:
+            for letter in solution.path:
+                letter.char = "q"
+        again = cache.solve(trie, GameBoard.from_letters(LETTERS, 0), "bitmask")
+        assert [[letter.char for letter in solution.path] for solution in again] == chars
+
+def test_boards_dont_share_letters_with_the_ocr_cache():
+    cache = OcrCache()
+    board = GameBoard("sample_data/game.png", num_swaps=0, ocr="template", ocr_cache=cache)
+    chars = [letter.char for letter in board.tiles()]
+    board.grid[0][0].char = "q"
+    again = GameBoard("sample_data/game.png", num_swaps=0, ocr="template", ocr_cache=cache)
+    assert [letter.char for letter in again.tiles()] == chars
+    again.grid[0][0].char = "q"
+    assert [letter.char for letter in GameBoard("sample_data/game.png", num_swaps=0, ocr="template", ocr_cache=cache).tiles()] == chars
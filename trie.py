@@ -1,3 +1,6 @@
+import hashlib
+from letter import Letter
+
 class TrieNode:
     def __init__(self, char):
         self.char = char
@@ -31,11 +34,55 @@ def construct_trie_dic(words: list):
         trie[""] = None
     return trie_root
 
+# Key under which annotate_bounds stores, for each node of a dict trie, how far
+# the words below it can still go: (most letters left to add, most letter
+# points those letters are worth before any board multipliers).
+BOUND_KEY = "#"
+
+def annotate_bounds(trie: dict) -> tuple:
+    '''Stores the remaining length and points bound on every node of a dict
+    trie, in place. Returns the bound for the root.'''
+    trie = trie[""]
+    def children(node):
+        return [(char, child) for char, child in node.items() if child is not None and char != BOUND_KEY]
+    # Post-order walk with an explicit stack, children before parents
+    stack = [(trie, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            lengths, points = [0], [0]
+            for char, child in children(node):
+                child_length, child_points = child[BOUND_KEY]
+                lengths.append(child_length + 1)
+                points.append(child_points + Letter.char_to_points.get(char, 0))
+            node[BOUND_KEY] = (max(lengths), max(points))
+        else:
+            stack.append((node, True))
+            stack += [(child, False) for _, child in children(node)]
+    return trie[BOUND_KEY]
+
+def fingerprint(trie: dict) -> str:
+    '''Hash of the words in a dict trie, the same however they were inserted
+    and whether or not the bounds are annotated'''
+    key = hashlib.sha256()
+    # Pre-order walk with children in order, writing each letter going down
+    # and ")" coming back up
+    stack = [("", trie[""])]
+    while stack:
+        char, node = stack.pop()
+        key.update(char.encode())
+        if node is None: continue
+        if "" in node: key.update(b".")
+        stack.append((")", None))
+        stack += [(char, node[char]) for char in sorted(node, reverse=True) if char != "" and char != BOUND_KEY]
+    return key.hexdigest()[:16]
+
 '''
 Trie with children stored as dict is 62109896 bytes in memory.
 Trie with children stored as list is 112461624 bytes in memory.
 Trie with children stored as dict is 1719158 bytes after pickling.
 Trie with children stored as list is 12207107 bytes after pickling.
+Minimized trie from dawg.py is 45247 nodes and 4886692 bytes on disk, mapped rather than loaded.
 '''
 
 if __name__ == "__main__":